@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Barrier, Pool
+
+from constants import *
+from formats import FORMATS, load_puzzles
+from nonogram import LineCache, Nonogram, SolveInterrupted
+from options import add_solver_arguments, get_solver_options
+
+CELL_SYMBOLS = {FILLED: '#', EMPTY: '.', UNKNOWN: '?'}
+
+worker_options = {}
+worker_cache = None
+worker_count_limit = 0
+worker_barrier = None
+
+
+def read_puzzles(paths, puzzle_format=None):
+    for path in paths:
+        yield from load_puzzles(path, puzzle_format)
+
+
+def init_worker(options, cache_size, count_limit=0, cache_path=None, barrier=None):
+    global worker_options, worker_cache, worker_count_limit, worker_barrier
+    worker_options = options
+    if cache_path is not None and os.path.exists(cache_path):
+        worker_cache = LineCache.load(cache_path, cache_size)
+    else:
+        worker_cache = LineCache(cache_size)
+    worker_count_limit = count_limit
+    worker_barrier = barrier
+
+
+def get_cache_entries(_):
+    # Every worker waits for the others before answering, so that each one sends its own cache once
+    if worker_barrier is not None:
+        worker_barrier.wait()
+    return list(worker_cache.entries.items())
+
+
+def save_cache(path, workers_entries, cache_size):
+    # The most recently used entries of the workers are kept, the oldest ones go past the size of the cache
+    cache = LineCache(cache_size)
+    for entries in workers_entries:
+        for key, result in entries:
+            cache.put(key, result)
+    cache.save(path)
+
+
+def format_grid(grid):
+    return [''.join(CELL_SYMBOLS[value] for value in row) for row in grid]
+
+
+def solve_puzzle(task):
+    index, puzzle = task
+    start = time.perf_counter()
+    nonogram = Nonogram(clues=(puzzle['vertical'], puzzle['horizontal']), cache=worker_cache, **worker_options)
+    solutions = None
+    if worker_count_limit:
+        try:
+            count, solutions = nonogram.count_solutions(worker_count_limit)
+            status = 'solved' if solutions else 'contradiction'
+        except SolveInterrupted as interruption:
+            count, solutions, status = None, [], interruption.status
+        grid = solutions[0] if solutions else nonogram.get_rows()
+    else:
+        status, grid = nonogram.solve_with_status()
+    elapsed = time.perf_counter() - start
+    result = {
+        'index': index,
+        'id': puzzle.get('id', index),
+        'status': status,
+        'solved': status == 'solved',
+        'contradiction': status == 'contradiction',
+        'solution': format_grid(grid),
+        'time': round(elapsed, 6),
+    }
+    if solutions is not None:
+        result['solution_count'] = count
+        result['solutions'] = [format_grid(solution) for solution in solutions]
+    if nonogram.stats:
+        result['stats'] = nonogram.get_stats()
+    return result
+
+
+def write_results(results, output):
+    for result in results:
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve many puzzles without a GUI, one JSON object per line.")
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help="puzzle files, '-' reads stdin")
+    parser.add_argument('-f', '--format', choices=FORMATS,
+                        help="format of the inputs, guessed from their extension by default, stdin is read as JSONL")
+    parser.add_argument('-o', '--output', default='-')
+    parser.add_argument('-j', '--processes', default=os.cpu_count(), type=int)
+    parser.add_argument('--order', default='input', choices=('input', 'completion'))
+    parser.add_argument('--chunksize', default=1, type=int)
+    parser.add_argument('--cache-size', default=200000, type=int)
+    parser.add_argument('--line-cache', metavar='PATH',
+                        help="start the workers with the line cache saved in PATH, and save their caches to it at the end")
+    add_solver_arguments(parser, budget=True)
+    parser.add_argument('--count-solutions', default=0, type=int, metavar='LIMIT',
+                        help="count the solutions up to LIMIT, 2 tells whether the solution is unique")
+    parser.add_argument('--stats', action='store_true', help="add the solver counters and phase timings to each result")
+    args = parser.parse_args()
+
+    assert 1 <= args.processes, "The number of processes should be strictly positive."
+    assert 0 <= args.count_solutions, "The solution count limit should be positive."
+    assert args.search != 'parallel' or args.processes == 1, "The parallel search has its own processes, use -j 1."
+
+    options = {**get_solver_options(args, budget=True), 'stats': args.stats}
+    tasks = enumerate(read_puzzles(args.inputs, args.format))
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        if args.processes == 1:
+            init_worker(options, args.cache_size, args.count_solutions, args.line_cache)
+            write_results(map(solve_puzzle, tasks), output)
+            if args.line_cache:
+                save_cache(args.line_cache, [get_cache_entries(None)], args.cache_size)
+        else:
+            barrier = Barrier(args.processes) if args.line_cache else None
+            initargs = (options, args.cache_size, args.count_solutions, args.line_cache, barrier)
+            with Pool(args.processes, initializer=init_worker, initargs=initargs) as pool:
+                imap = pool.imap if args.order == 'input' else pool.imap_unordered
+                write_results(imap(solve_puzzle, tasks, chunksize=args.chunksize), output)
+                if args.line_cache:
+                    save_cache(args.line_cache, pool.map(get_cache_entries, range(args.processes), chunksize=1), args.cache_size)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
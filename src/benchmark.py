@@ -0,0 +1,367 @@
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from constants import *
+from formats import FORMATS, load_puzzles, make_puzzle, save_puzzles
+from nonogram import LINE_SOLVERS, LineCache, Nonogram
+
+SIZES = (10, 25, 50, 100, 200)
+DENSITIES = (0.7, 0.8)
+SEEDS = (1, 2, 3)
+# Random puzzles that line solving alone cannot finish, as (seed, n, m, density)
+HARD_PUZZLES = (
+    (1, 25, 25, 0.5),
+    (4, 25, 25, 0.5),
+    (12, 25, 25, 0.5),
+    (14, 25, 25, 0.5),
+)
+CONFIGURATIONS = {
+    'default': {},
+    'dp': {'line_solver': 'dp'},
+    'placements': {'line_solver': 'placements'},
+    'copy': {'search': 'copy'},
+    'probing': {'probing': True},
+    'decompose': {'decompose': True},
+    'compact': {'compact': True},
+    'vectorized': {'vectorized': True},
+    'most_constrained_cell': {'branching': 'most_constrained_cell'},
+}
+# Clues without any solution, as (vertical, horizontal), every configuration has to find the contradiction
+UNSOLVABLE_PUZZLES = (
+    ([[3, 1]], [[1], [], [1], [], [1]]),
+    ([[1], [2]], [[2], [1], [1]]),
+)
+# Random lines checked against all their completions, short enough to enumerate them
+LINE_CHECKS = 500
+MAX_CHECKED_LINE_LENGTH = 10
+# Puzzles that every configuration without probing has to deduce the same cells of, as (seed, n, m, density)
+DEDUCTION_PUZZLES = ((1, 10, 10, 0.5), (2, 15, 15, 0.6), *HARD_PUZZLES)
+# Puzzles written and read back in every format, the zeros of their clues are dropped by the readers
+FORMAT_PUZZLES = (
+    {'vertical': [[2], [0], [1, 0, 1]], 'horizontal': [[1, 1], [0], [1, 1]], 'id': 'heart', 'title': 'T "1"'},
+    {'vertical': [[1]], 'horizontal': [[1]], 'id': 'a\\b "c"'},
+)
+# Fields that each format keeps besides the clues
+FORMAT_FIELDS = {'jsonl': ('id', 'title'), 'clues': (), 'non': ('id', 'title'), 'xml': ('id', 'title'), 'binary': ('id',)}
+# The modules of the command-line entry points, and the ones only some of their features should import
+STARTUP_MODULES = ('main', 'batch', 'server', 'parallel', 'events', 'formats')
+LAZY_MODULES = ('pygame', 'numpy')
+# Seconds to import all the entry points in a fresh interpreter
+IMPORT_BUDGET = 0.25
+STARTUP_REPEAT = 5
+
+
+def build_corpus(sizes, densities, seeds, hard):
+    corpus = []
+    for size in sizes:
+        for density in densities:
+            for seed in seeds:
+                corpus.append({'group': f'{size}x{size}@{density}', 'seed': seed, 'n': size, 'm': size, 'density': density})
+    if hard:
+        for seed, n, m, density in HARD_PUZZLES:
+            corpus.append({'group': 'hard', 'seed': seed, 'n': n, 'm': m, 'density': density})
+    return corpus
+
+
+def run_puzzle(puzzle, options, measure_memory):
+    nonogram = Nonogram(seed=puzzle['seed'], n=puzzle['n'], m=puzzle['m'], density=puzzle['density'], **options)
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    grid = nonogram.solve()
+    elapsed = time.perf_counter() - start
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    stats = nonogram.lines_to_solve.get_stats()
+    return {
+        'time': elapsed,
+        'lines_solved': stats['solved'],
+        'lines_changed': stats['changed'],
+        'solved': all(UNKNOWN not in row for row in grid),
+        'peak_memory': peak_memory,
+    }
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(results):
+    times = [result['time'] for result in results]
+    peak_memories = [result['peak_memory'] for result in results if result['peak_memory'] is not None]
+    return {
+        'count': len(results),
+        'median': statistics.median(times),
+        'p95': percentile(times, .95),
+        'lines_solved': sum(result['lines_solved'] for result in results),
+        'lines_changed': sum(result['lines_changed'] for result in results),
+        'unsolved': sum(not result['solved'] for result in results),
+        'peak_memory': max(peak_memories) if peak_memories else None,
+    }
+
+
+def run(corpus, configurations, repeat, measure_memory):
+    report = {}
+    for name in configurations:
+        groups = {}
+        for puzzle in corpus:
+            # Keep the fastest of the repeats to damp the noise of the machine
+            result = min((run_puzzle(puzzle, CONFIGURATIONS[name], False) for _ in range(repeat)), key=lambda r: r['time'])
+            if measure_memory:
+                result['peak_memory'] = run_puzzle(puzzle, CONFIGURATIONS[name], True)['peak_memory']
+            groups.setdefault(puzzle['group'], []).append(result)
+            print(f"{name:>22} {puzzle['group']:>12} seed {puzzle['seed']:<3} {result['time']:8.3f}s", file=sys.stderr)
+        report[name] = {group: summarize(results) for group, results in groups.items()}
+    return report
+
+
+def compare(report, baseline, tolerance, min_difference):
+    regressions = []
+    for name, groups in report.items():
+        for group, summary in groups.items():
+            reference = baseline.get(name, {}).get(group)
+            if reference is None:
+                continue
+            for metric in ('median', 'p95'):
+                limit = max(reference[metric] * (1 + tolerance), reference[metric] + min_difference)
+                if summary[metric] > limit:
+                    regressions.append(
+                        f"{name} {group} {metric}: {summary[metric]:.3f}s, baseline {reference[metric]:.3f}s"
+                    )
+            if summary['unsolved'] > reference['unsolved']:
+                regressions.append(f"{name} {group}: {summary['unsolved']} unsolved, baseline {reference['unsolved']}")
+    return regressions
+
+
+def measure_startup(repeat):
+    # Import the entry points in fresh interpreters and keep the fastest time, with the lazy modules they loaded
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {', '.join(STARTUP_MODULES)}\n"
+        "print(time.perf_counter() - start, *(name for name in sys.argv[1:] if name in sys.modules))\n"
+    )
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    loaded = set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', code, *LAZY_MODULES], cwd=directory, capture_output=True, text=True, check=True
+        ).stdout.splitlines()[-1].split()
+        times.append(float(output[0]))
+        loaded.update(output[1:])
+    return {'time': min(times), 'loaded': sorted(loaded)}
+
+
+def check_startup(startup, budget):
+    failures = []
+    if startup['time'] > budget:
+        failures.append(f"importing the entry points took {startup['time']:.3f}s, budget {budget:.3f}s")
+    for name in startup['loaded']:
+        failures.append(f"importing the entry points loaded {name}")
+    return failures
+
+
+def check_unsolvable(configurations):
+    # Neither the solve nor the solution count may return a grid that breaks the clues
+    failures = []
+    for name in configurations:
+        for clues in UNSOLVABLE_PUZZLES:
+            status, _ = Nonogram(clues=clues, **CONFIGURATIONS[name]).solve_with_status()
+            count, _ = Nonogram(clues=clues, **CONFIGURATIONS[name]).count_solutions()
+            if status != 'contradiction' or count:
+                failures.append(f"{name} on the unsolvable clues {clues}: {status} with {count} solutions")
+    return failures
+
+
+def get_line_cases(count, seed):
+    # Clues of a random line with some of its cells known, and sometimes a wrong one
+    generator = random.Random(seed)
+    for _ in range(count):
+        length = generator.randint(1, MAX_CHECKED_LINE_LENGTH)
+        cells = [FILLED if generator.random() < .5 else EMPTY for _ in range(length)]
+        values = [value if generator.random() < .3 else UNKNOWN for value in cells]
+        if generator.random() < .2:
+            i = generator.randrange(length)
+            values[i] = EMPTY if cells[i] == FILLED else FILLED
+        yield Nonogram.get_clues_from_values(cells), cells, values
+
+
+def enumerate_line(clues, values):
+    # Cells with the same value in every completion of the line that matches its clues, None without any
+    unknown = [i for i, value in enumerate(values) if value == UNKNOWN]
+    common = None
+    for bits in range(1 << len(unknown)):
+        completion = list(values)
+        for k, i in enumerate(unknown):
+            completion[i] = FILLED if bits >> k & 1 else EMPTY
+        if Nonogram.get_clues_from_values(completion) == clues:
+            common = completion if common is None else [value if value == other else UNKNOWN for value, other in zip(common, completion)]
+    return common
+
+
+def solve_single_line(clues, cells, values, solve, **options):
+    # The row of a one row puzzle, its columns only make the puzzle valid and are never solved
+    nonogram = Nonogram(clues=([[1] if value == FILLED else [] for value in cells], [clues]), **options)
+    row = nonogram.horizontal_lines[0]
+    nonogram.update_grid_from_values(row, values)
+    try:
+        solve(nonogram, row)
+    except (AssertionError, IndexError):
+        return None
+    return list(nonogram.get_line_values(row))
+
+
+def check_line_solvers(count=LINE_CHECKS, seed=1):
+    # The line solvers find exactly the cells fixed in every completion, the quick pass and the sweeps may find fewer
+    failures = []
+    caches = {name: LineCache() for name in LINE_SOLVERS}
+    partial_solves = {'quick pass': lambda nonogram, row: nonogram.solve_line(row, nonogram.optimized_solve_for_values)}
+    # Imported here, NumPy is only needed by the vectorized sweeps
+    import sweeps
+    if sweeps.np is not None:
+        partial_solves['sweeps'] = lambda nonogram, row: sweeps.sweep(nonogram, [row])
+    for clues, cells, values in get_line_cases(count, seed):
+        expected = enumerate_line(clues, values)
+        for name in LINE_SOLVERS:
+            result = solve_single_line(clues, cells, values, lambda nonogram, row: nonogram.solve_line(row, nonogram.line_solver),
+                                       line_solver=name, cache=caches[name])
+            if result != expected:
+                failures.append(f"the {name} line solver on {clues} and {values}: {result}, expected {expected}")
+        if expected is None:
+            continue
+        for name, solve in partial_solves.items():
+            result = solve_single_line(clues, cells, values, solve)
+            if result is None or any(value not in (UNKNOWN, other) for value, other in zip(result, expected)):
+                failures.append(f"the {name} on {clues} and {values}: {result}, expected at most {expected}")
+    return failures
+
+
+def deduce_puzzle(seed, n, m, density, options):
+    nonogram = Nonogram(seed=seed, n=n, m=m, density=density, **options)
+    nonogram.deduce()
+    return nonogram.get_rows()
+
+
+def check_deductions():
+    # Line solving stops on the same cells whatever the line solver, the grid or the sweeps, only probing goes further
+    failures = []
+    for puzzle in DEDUCTION_PUZZLES:
+        reference = deduce_puzzle(*puzzle, {})
+        for name, options in CONFIGURATIONS.items():
+            if options.get('probing'):
+                continue
+            try:
+                rows = deduce_puzzle(*puzzle, options)
+            except ValueError:
+                # The vectorized sweeps without NumPy
+                continue
+            if rows != reference:
+                different = sum(value != other for row, other_row in zip(rows, reference) for value, other in zip(row, other_row))
+                failures.append(f"{name} on the puzzle {puzzle}: {different} cells differ from the default configuration")
+    return failures
+
+
+def check_formats():
+    # Every format gives back the clues it was written with, and the fields it keeps
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        for puzzle_format in FORMATS:
+            fields = FORMAT_FIELDS[puzzle_format]
+            path = os.path.join(directory, f'puzzles.{puzzle_format}')
+            save_puzzles(path, FORMAT_PUZZLES, puzzle_format)
+            loaded = list(load_puzzles(path, puzzle_format))
+            expected = [
+                make_puzzle(puzzle['vertical'], puzzle['horizontal'], *(puzzle.get(field) if field in fields else None for field in ('id', 'title')))
+                for puzzle in FORMAT_PUZZLES
+            ]
+            if loaded != expected:
+                failures.append(f"the {puzzle_format} format read back {loaded}, expected {expected}")
+    return failures
+
+
+def print_report(report):
+    print(f"{'configuration':>22} {'group':>12} {'median':>9} {'p95':>9} {'lines':>8} {'changed':>8} {'unsolved':>8} {'memory':>10}")
+    for name, groups in report.items():
+        for group, summary in groups.items():
+            memory = f"{summary['peak_memory'] / 2 ** 20:.1f}MiB" if summary['peak_memory'] is not None else '-'
+            print(
+                f"{name:>22} {group:>12} {summary['median']:8.3f}s {summary['p95']:8.3f}s "
+                f"{summary['lines_solved']:>8} {summary['lines_changed']:>8} {summary['unsolved']:>8} {memory:>10}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the solver on a fixed corpus of random puzzles.")
+    parser.add_argument('-c', '--configurations', nargs='+', default=['default'], choices=CONFIGURATIONS)
+    parser.add_argument('--sizes', nargs='+', default=SIZES, type=int)
+    parser.add_argument('--densities', nargs='+', default=DENSITIES, type=float)
+    parser.add_argument('--seeds', nargs='+', default=SEEDS, type=int)
+    parser.add_argument('--no-hard', action='store_true', help="skip the puzzles that need guessing")
+    parser.add_argument('-r', '--repeat', default=1, type=int)
+    parser.add_argument('-m', '--memory', action='store_true', help="also measure the peak memory, in a separate run")
+    parser.add_argument('-o', '--output', help="write the report as JSON")
+    parser.add_argument('--save-baseline', help="write the report as the new baseline JSON")
+    parser.add_argument('--baseline', help="compare against a baseline JSON and fail on regressions")
+    parser.add_argument('--tolerance', default=0.25, type=float, help="allowed relative slowdown")
+    parser.add_argument('--min-difference', default=0.05, type=float, help="slowdowns below it in seconds are ignored")
+    parser.add_argument('--import-budget', default=IMPORT_BUDGET, type=float, metavar='SECONDS',
+                        help="fail when importing the entry points takes longer")
+    args = parser.parse_args()
+
+    assert all(seed > 0 for seed in args.seeds), "The seeds should be strictly positive."
+    assert 1 <= args.repeat, "The number of repeats should be strictly positive."
+
+    # The start-up and the results of the solvers and of the formats are checked first, they take a few seconds
+    startup = measure_startup(STARTUP_REPEAT)
+    print(f"Importing the entry points took {startup['time']:.3f}s")
+    failures = (
+        check_startup(startup, args.import_budget)
+        + check_unsolvable(args.configurations)
+        + check_line_solvers()
+        + check_deductions()
+        + check_formats()
+    )
+    if failures:
+        print("Failed checks:", file=sys.stderr)
+        for failure in failures:
+            print(f"  {failure}", file=sys.stderr)
+
+    corpus = build_corpus(args.sizes, args.densities, args.seeds, not args.no_hard)
+    report = run(corpus, args.configurations, args.repeat, args.memory)
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance, args.min_difference)
+        if regressions:
+            print("Regressions against the baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+        print("No regression against the baseline.")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import json
+import queue
+import threading
+import time
+
+# The solver publishes its progress as events, each one a tuple of (x, y, value) for the cells that changed
+# since the previous event. Consumers get them from a bounded queue on their own thread, so the solve never
+# waits on rendering, or write them to a log that can be replayed after the solve.
+
+
+class EventQueue:
+    def __init__(self, max_events=1024):
+        self.queue = queue.Queue(max_events)
+
+    def emit(self, changes):
+        # Blocks the solver while the queue is full, so a slow consumer cannot make it grow without bound
+        self.queue.put(changes)
+
+    def close(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+        while True:
+            changes = self.queue.get()
+            if changes is None:
+                return
+            yield changes
+
+
+class EventRecorder:
+    # Writes a log with the clues on the first line, then one flat [x, y, value, ...] list per event
+    def __init__(self, path, nonogram):
+        self.file = open(path, 'w')
+        self.file.write(json.dumps({'vertical': nonogram.vertical_clues, 'horizontal': nonogram.horizontal_clues}) + '\n')
+
+    def emit(self, changes):
+        self.file.write(json.dumps([value for change in changes for value in change], separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class EventTee:
+    def __init__(self, *consumers):
+        self.consumers = consumers
+
+    def emit(self, changes):
+        for consumer in self.consumers:
+            consumer.emit(changes)
+
+    def close(self):
+        for consumer in self.consumers:
+            consumer.close()
+
+
+def read_event_log(path):
+    with open(path) as file:
+        clues = json.loads(file.readline())
+        events = []
+        for line in file:
+            values = json.loads(line)
+            events.append(tuple(zip(values[0::3], values[1::3], values[2::3])))
+    return (clues['vertical'], clues['horizontal']), events
+
+
+def solve_events(nonogram, max_events=1024, record=None):
+    # Solve on a background thread and yield its events, the solution is the value returned by the generator
+    events = EventQueue(max_events)
+    recorder = EventRecorder(record, nonogram) if record else None
+    consumer = EventTee(events, recorder) if recorder else events
+    nonogram.set_events(consumer)
+    result = {}
+
+    def run():
+        try:
+            result['grid'] = nonogram.solve()
+        except BaseException as exception:
+            result['exception'] = exception
+        finally:
+            nonogram.set_events(None)
+            consumer.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    yield from events
+    thread.join()
+    if 'exception' in result:
+        raise result['exception']
+    return result['grid']
+
+
+def replay(events, consumer, events_per_second=None):
+    # Feed recorded events to a consumer, as fast as possible or at the given rate
+    start = time.perf_counter()
+    for n, changes in enumerate(events):
+        if events_per_second:
+            delay = start + n / events_per_second - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        consumer.emit(changes)
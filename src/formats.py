@@ -0,0 +1,347 @@
+import itertools
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+# Puzzles are dicts with the 'vertical' (columns) and 'horizontal' (rows) clues, and an optional 'id' and 'title'
+
+BINARY_MAGIC = b'NONO'
+BINARY_VERSION = 1
+# Magic, version, number of puzzles, offset of the index
+BINARY_HEADER = struct.Struct('<4sHIQ')
+# Width, height, length of the id in bytes, number of 16 bits words of clues
+BINARY_RECORD_HEADER = struct.Struct('<IIHI')
+
+FORMATS = ('jsonl', 'clues', 'non', 'xml', 'binary')
+EXTENSIONS = {
+    '.jsonl': 'jsonl',
+    '.json': 'jsonl',
+    '.txt': 'clues',
+    '.clues': 'clues',
+    '.non': 'non',
+    '.xml': 'xml',
+    '.pbn': 'xml',
+    '.nonobin': 'binary',
+}
+
+
+def make_puzzle(vertical_clues, horizontal_clues, puzzle_id=None, title=None):
+    # Zero clues are dropped for every format, a line of [0] is a line without clues
+    puzzle = {
+        'vertical': [[clue for clue in clues if clue != 0] for clues in vertical_clues],
+        'horizontal': [[clue for clue in clues if clue != 0] for clues in horizontal_clues],
+    }
+    if puzzle_id is not None:
+        puzzle['id'] = puzzle_id
+    if title is not None:
+        puzzle['title'] = title
+    return puzzle
+
+
+def parse_clue_line(line):
+    clues = [int(clue) for clue in line.replace(',', ' ').split()]
+    if any(clue < 0 for clue in clues):
+        raise ValueError(f"Negative clue in line '{line}'")
+    return clues
+
+
+def format_clue_line(clues, separator=' '):
+    return separator.join(str(clue) for clue in clues) if clues else '0'
+
+
+def read_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            puzzle = json.loads(line)
+            yield make_puzzle(puzzle['vertical'], puzzle['horizontal'], puzzle.get('id'), puzzle.get('title'))
+
+
+def write_jsonl(puzzles, file):
+    for puzzle in puzzles:
+        file.write(json.dumps(puzzle) + '\n')
+
+
+# Plain clue-per-line format: a 'WIDTH HEIGHT' line, then one line per row and one line per column,
+# clues separated with spaces and '0' for a line without clues. Blank lines and '#' comments are skipped.
+
+def read_clues(file):
+    lines = (line.strip() for line in file)
+    lines = (line for line in lines if line and not line.startswith('#'))
+    for header in lines:
+        width, height = (int(size) for size in header.split())
+        horizontal_clues = [parse_clue_line(line) for line in itertools.islice(lines, height)]
+        if len(horizontal_clues) < height:
+            raise ValueError(f"Missing {height - len(horizontal_clues)} lines in the rows clues")
+        vertical_clues = [parse_clue_line(line) for line in itertools.islice(lines, width)]
+        if len(vertical_clues) < width:
+            raise ValueError(f"Missing {width - len(vertical_clues)} lines in the columns clues")
+        yield make_puzzle(vertical_clues, horizontal_clues)
+
+
+def write_clues(puzzles, file):
+    for puzzle in puzzles:
+        file.write(f"{len(puzzle['vertical'])} {len(puzzle['horizontal'])}\n")
+        for clues in puzzle['horizontal']:
+            file.write(format_clue_line(clues) + '\n')
+        for clues in puzzle['vertical']:
+            file.write(format_clue_line(clues) + '\n')
+        file.write('\n')
+
+
+# The .non format: 'width', 'height', 'rows' and 'columns' keywords, clues separated with commas.
+# Several puzzles can follow each other, a keyword repeated after both clue sections starts a new puzzle.
+# Values may be quoted, with backslashes before the quotes and backslashes they hold.
+
+def quote_value(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def unquote_value(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def read_non(file):
+    attributes = {}
+    sections = {}
+    section = None
+    remaining = 0
+
+    def build_puzzle():
+        return make_puzzle(sections['columns'], sections['rows'], attributes.get('id'), attributes.get('title'))
+
+    for line in file:
+        line = line.strip()
+        if remaining:
+            sections[section].append(parse_clue_line(line))
+            remaining -= 1
+            continue
+        if not line or line.startswith('#'):
+            continue
+
+        keyword, _, value = line.partition(' ')
+        keyword = keyword.lower()
+        value = unquote_value(value.strip())
+        if 'rows' in sections and 'columns' in sections and (keyword in attributes or keyword in sections):
+            yield build_puzzle()
+            attributes, sections = {}, {}
+        if keyword in ('width', 'height'):
+            attributes[keyword] = int(value)
+        elif keyword in ('rows', 'columns'):
+            size_keyword = 'height' if keyword == 'rows' else 'width'
+            if size_keyword not in attributes:
+                raise ValueError(f"'{keyword}' found before '{size_keyword}'")
+            section, remaining = keyword, attributes[size_keyword]
+            sections[section] = []
+        else:
+            attributes[keyword] = value
+
+    if remaining:
+        raise ValueError(f"Missing {remaining} lines in the '{section}' section")
+    if 'rows' in sections and 'columns' in sections:
+        yield build_puzzle()
+
+
+def write_non(puzzles, file):
+    for puzzle in puzzles:
+        if 'title' in puzzle:
+            file.write(f"title {quote_value(puzzle['title'])}\n")
+        if 'id' in puzzle:
+            file.write(f"id {quote_value(puzzle['id'])}\n")
+        file.write(f"width {len(puzzle['vertical'])}\n")
+        file.write(f"height {len(puzzle['horizontal'])}\n")
+        file.write("\nrows\n")
+        for clues in puzzle['horizontal']:
+            file.write(format_clue_line(clues, ',') + '\n')
+        file.write("\ncolumns\n")
+        for clues in puzzle['vertical']:
+            file.write(format_clue_line(clues, ',') + '\n')
+        file.write('\n')
+
+
+# The XML puzzle format: <puzzleset> of <puzzle> elements holding a <clue type="columns"> and a
+# <clue type="rows"> element, with one <line> of <count> elements per line. Only one color is supported.
+
+def read_xml(file):
+    # The XML modules are imported by the XML format only, they are most of the start-up time of the others
+    import xml.etree.ElementTree as ElementTree
+    for _, element in ElementTree.iterparse(file, events=('end',)):
+        if element.tag != 'puzzle':
+            continue
+        clues = {}
+        for clue in element.iter('clue'):
+            clues[clue.get('type')] = [
+                [int(count.text) for count in line.iter('count')]
+                for line in clue.iter('line')
+            ]
+        if 'columns' not in clues or 'rows' not in clues:
+            raise ValueError("A puzzle is missing its columns or rows clues")
+        puzzle_id = element.findtext('id')
+        title = element.findtext('title')
+        element.clear()
+        yield make_puzzle(clues['columns'], clues['rows'], puzzle_id, title)
+
+
+def write_xml(puzzles, file):
+    from xml.sax.saxutils import escape
+    file.write('<?xml version="1.0"?>\n<puzzleset>\n')
+    for puzzle in puzzles:
+        file.write('<puzzle type="grid" defaultcolor="black">\n')
+        if 'id' in puzzle:
+            file.write(f"<id>{escape(str(puzzle['id']))}</id>\n")
+        if 'title' in puzzle:
+            file.write(f"<title>{escape(str(puzzle['title']))}</title>\n")
+        for clue_type, lines in (('columns', puzzle['vertical']), ('rows', puzzle['horizontal'])):
+            file.write(f'<clue type="{clue_type}">\n')
+            for clues in lines:
+                file.write('<line>' + ''.join(f'<count>{clue}</count>' for clue in clues) + '</line>\n')
+            file.write('</clue>\n')
+        file.write('</puzzle>\n')
+    file.write('</puzzleset>\n')
+
+
+# Binary container: a header, the puzzle records, then an index with the offset of every record,
+# so a reader can jump to any puzzle without parsing the ones before it.
+
+def encode_record(puzzle):
+    words = array('H')
+    for clues in (*puzzle['vertical'], *puzzle['horizontal']):
+        words.append(len(clues))
+        words.extend(clues)
+    if sys.byteorder != 'little':
+        words.byteswap()
+    puzzle_id = str(puzzle['id']).encode() if 'id' in puzzle else b''
+    header = BINARY_RECORD_HEADER.pack(len(puzzle['vertical']), len(puzzle['horizontal']), len(puzzle_id), len(words))
+    return header + puzzle_id + words.tobytes()
+
+
+def decode_record(buffer, offset):
+    width, height, id_length, words_length = BINARY_RECORD_HEADER.unpack_from(buffer, offset)
+    offset += BINARY_RECORD_HEADER.size
+    puzzle_id = bytes(buffer[offset:offset + id_length]).decode() if id_length else None
+    offset += id_length
+    words = array('H')
+    words.frombytes(buffer[offset:offset + 2 * words_length])
+    if sys.byteorder != 'little':
+        words.byteswap()
+
+    lines = []
+    i = 0
+    for _ in range(width + height):
+        length = words[i]
+        lines.append(words[i + 1:i + 1 + length].tolist())
+        i += length + 1
+    return make_puzzle(lines[:width], lines[width:], puzzle_id)
+
+
+def write_binary(puzzles, file):
+    start = file.tell()
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, 0))
+    offsets = array('Q')
+    for puzzle in puzzles:
+        offsets.append(file.tell() - start)
+        file.write(encode_record(puzzle))
+    index_offset = file.tell() - start
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    file.write(offsets.tobytes())
+    end = file.tell()
+    file.seek(start)
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(offsets), index_offset))
+    file.seek(end)
+
+
+class BinaryCorpus:
+    def __init__(self, path):
+        if path == '-':
+            # A pipe cannot be memory-mapped, the whole of stdin is read instead
+            self.file = None
+            self.buffer = sys.stdin.buffer.read()
+        else:
+            self.file = open(path, 'rb')
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < BINARY_HEADER.size:
+            raise ValueError(f"'{path}' is not a version {BINARY_VERSION} binary puzzle file")
+        magic, version, count, index_offset = BINARY_HEADER.unpack_from(self.buffer, 0)
+        if magic != BINARY_MAGIC or version != BINARY_VERSION:
+            raise ValueError(f"'{path}' is not a version {BINARY_VERSION} binary puzzle file")
+        self.count = count
+        self.index_offset = index_offset
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError("Puzzle index out of range")
+        offset, = struct.unpack_from('<Q', self.buffer, self.index_offset + 8 * n)
+        return decode_record(self.buffer, offset)
+
+    def __iter__(self):
+        for n in range(self.count):
+            yield self[n]
+
+    def close(self):
+        if self.file is not None:
+            self.buffer.close()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+READERS = {
+    'jsonl': read_jsonl,
+    'clues': read_clues,
+    'non': read_non,
+    'xml': read_xml,
+}
+WRITERS = {
+    'jsonl': write_jsonl,
+    'clues': write_clues,
+    'non': write_non,
+    'xml': write_xml,
+    'binary': write_binary,
+}
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        raise ValueError(f"Cannot guess the format of '{path}', expected one of {FORMATS}")
+    return EXTENSIONS[extension]
+
+
+def load_puzzles(path, puzzle_format=None):
+    if path == '-':
+        puzzle_format = puzzle_format or 'jsonl'
+    else:
+        puzzle_format = puzzle_format or guess_format(path)
+    if puzzle_format == 'binary':
+        with BinaryCorpus(path) as corpus:
+            yield from corpus
+    elif path == '-':
+        yield from READERS[puzzle_format](sys.stdin.buffer if puzzle_format == 'xml' else sys.stdin)
+    elif puzzle_format == 'xml':
+        with open(path, 'rb') as file:
+            yield from read_xml(file)
+    else:
+        with open(path) as file:
+            yield from READERS[puzzle_format](file)
+
+
+def save_puzzles(path, puzzles, puzzle_format=None):
+    puzzle_format = puzzle_format or guess_format(path)
+    with open(path, 'wb' if puzzle_format == 'binary' else 'w') as file:
+        WRITERS[puzzle_format](puzzles, file)
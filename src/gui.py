@@ -1,4 +1,5 @@
 import os
+import time
 
 import pygame
 
@@ -7,14 +8,22 @@ from constants import *
 BACKGROUND_COLOR = (255, 255, 255)
 BLACK_COLOR = (0, 0, 0)
 RED_COLOR = (240, 0, 0)
+# Found from the package rather than the working directory, so the GUI starts from anywhere
+RES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'res')
 
 
 class GUI:
-    def __init__(self, nonogram, draw_crosses=False):
+    def __init__(self, nonogram, draw_crosses=False, fps=60, from_events=False):
         self.nonogram = nonogram
+        # When fed with events, the GUI keeps its own copy of the grid instead of reading the solver's one
+        self.event_grid = [[UNKNOWN] * len(nonogram.horizontal_clues) for _ in nonogram.vertical_clues] if from_events else None
         self.draw_crosses = draw_crosses
+        self.frame_duration = 1 / fps if fps else 0
+        self.last_frame_time = 0
+        self.dirty_cells = set()
 
-        pygame.init()
+        # Only the modules the GUI uses, pygame.init would also start the audio and the joysticks
+        pygame.display.init()
         os.environ['SDL_VIDEO_CENTERED'] = '1'
 
         self.max_length_vertical_clues = max(len(clues) for clues in nonogram.vertical_clues)
@@ -31,7 +40,10 @@ class GUI:
         self.line_width_pixel = max(self.size_cell_pixel // 16, 1)
         self.bold_line_width_pixel = self.line_width_pixel * 2
 
-        self.text_font = pygame.font.Font('freesansbold.ttf', int(0.7 * self.size_cell_pixel))
+        # The font and the cross are loaded the first time they are drawn
+        self.text_font = None
+        self.glyphs = {}
+        self.cross_sprite = None
 
         self.board_origin_x_pixel = self.max_length_horizontal_clues * self.size_cell_pixel
         self.board_origin_y_pixel = self.max_length_vertical_clues * self.size_cell_pixel
@@ -45,15 +57,31 @@ class GUI:
 
         pygame.display.set_caption("Nonogram")
 
-        cross_sprite = pygame.image.load("../res/red_cross.png")
-        self.cross_sprite = pygame.transform.scale(cross_sprite, (round(0.8 * self.size_cell_pixel), round(0.8 * self.size_cell_pixel)))
+    @property
+    def grid(self):
+        return self.nonogram.grid if self.event_grid is None else self.event_grid
+
+    def get_glyph(self, text):
+        if text not in self.glyphs:
+            if self.text_font is None:
+                pygame.font.init()
+                self.text_font = pygame.font.Font('freesansbold.ttf', int(0.7 * self.size_cell_pixel))
+            self.glyphs[text] = self.text_font.render(text, True, BLACK_COLOR)
+        return self.glyphs[text]
+
+    def get_cross_sprite(self):
+        if self.cross_sprite is None:
+            cross_sprite = pygame.image.load(os.path.join(RES_DIRECTORY, 'red_cross.png'))
+            size = round(0.8 * self.size_cell_pixel)
+            self.cross_sprite = pygame.transform.scale(cross_sprite, (size, size))
+        return self.cross_sprite
 
     def draw_clues(self):
         # Draw the vertical clues
         for i, clues in enumerate(self.nonogram.vertical_clues):
             y_shift = self.max_length_vertical_clues - len(clues)
             for j, clue in enumerate(clues):
-                text_surface = self.text_font.render(str(clue), True, BLACK_COLOR)
+                text_surface = self.get_glyph(str(clue))
                 text_size_x, text_size_y = text_surface.get_size()
                 self.display.blit(
                     text_surface,
@@ -65,7 +93,7 @@ class GUI:
         for i, clues in enumerate(self.nonogram.horizontal_clues):
             x_shift = self.max_length_horizontal_clues - len(clues)
             for j, clue in enumerate(clues):
-                text_surface = self.text_font.render(str(clue), True, BLACK_COLOR)
+                text_surface = self.get_glyph(str(clue))
                 text_size_x, text_size_y = text_surface.get_size()
                 self.display.blit(
                     text_surface,
@@ -79,7 +107,7 @@ class GUI:
             for y in range(self.size_y):
                 pygame.draw.rect(
                     self.display,
-                    BLACK_COLOR if self.nonogram.grid[x][y] == FILLED else BACKGROUND_COLOR,
+                    BLACK_COLOR if self.grid[x][y] == FILLED else BACKGROUND_COLOR,
                     (
                         self.board_origin_x_pixel + x * self.size_cell_pixel,
                         self.board_origin_y_pixel + y * self.size_cell_pixel,
@@ -87,10 +115,12 @@ class GUI:
                         self.size_cell_pixel,
                     )
                 )
-                if self.draw_crosses and self.nonogram.grid[x][y] == EMPTY:
-                    rect = self.cross_sprite.get_rect()
+                if self.draw_crosses and self.grid[x][y] == EMPTY:
+                    cross_sprite = self.get_cross_sprite()
+                    rect = cross_sprite.get_rect()
                     rect.center = self.board_origin_x_pixel + (x + .5) * self.size_cell_pixel, self.board_origin_y_pixel + (y + .5) * self.size_cell_pixel
-                    self.display.blit(self.cross_sprite, rect)
+                    self.display.blit(cross_sprite, rect)
+        self.dirty_cells.clear()
 
         # Draw bold contour lines
         bold_lines = [
@@ -121,12 +151,69 @@ class GUI:
                              self.line_width_pixel)
 
         pygame.display.update()
+        self.last_frame_time = time.perf_counter()
+
+    def draw_cell(self, x, y):
+        cell_x_pixel = self.board_origin_x_pixel + x * self.size_cell_pixel
+        cell_y_pixel = self.board_origin_y_pixel + y * self.size_cell_pixel
+        pygame.draw.rect(
+            self.display,
+            BLACK_COLOR if self.grid[x][y] == FILLED else BACKGROUND_COLOR,
+            (cell_x_pixel, cell_y_pixel, self.size_cell_pixel, self.size_cell_pixel)
+        )
+        if self.draw_crosses and self.grid[x][y] == EMPTY:
+            cross_sprite = self.get_cross_sprite()
+            rect = cross_sprite.get_rect()
+            rect.center = cell_x_pixel + .5 * self.size_cell_pixel, cell_y_pixel + .5 * self.size_cell_pixel
+            self.display.blit(cross_sprite, rect)
+
+        # Draw the parts of the grid lines around the cell that the cell covered
+        cell_end_x_pixel = cell_x_pixel + self.size_cell_pixel
+        cell_end_y_pixel = cell_y_pixel + self.size_cell_pixel
+        borders = [
+            ((cell_x_pixel, cell_y_pixel), (cell_x_pixel, cell_end_y_pixel), x == 0),
+            ((cell_x_pixel, cell_y_pixel), (cell_end_x_pixel, cell_y_pixel), y == 0),
+        ]
+        if x < self.size_x - 1:
+            borders.append(((cell_end_x_pixel, cell_y_pixel), (cell_end_x_pixel, cell_end_y_pixel), False))
+        if y < self.size_y - 1:
+            borders.append(((cell_x_pixel, cell_end_y_pixel), (cell_end_x_pixel, cell_end_y_pixel), False))
+        for line_start, line_end, bold in borders:
+            pygame.draw.line(self.display,
+                             BLACK_COLOR,
+                             line_start,
+                             line_end,
+                             self.bold_line_width_pixel if bold else self.line_width_pixel)
+
+        return pygame.Rect(
+            cell_x_pixel - self.bold_line_width_pixel,
+            cell_y_pixel - self.bold_line_width_pixel,
+            self.size_cell_pixel + 2 * self.bold_line_width_pixel,
+            self.size_cell_pixel + 2 * self.bold_line_width_pixel,
+        )
+
+    def update(self, cells):
+        self.dirty_cells.update(cells)
+        if time.perf_counter() - self.last_frame_time >= self.frame_duration:
+            self.flush()
+
+    def emit(self, changes):
+        for x, y, value in changes:
+            self.event_grid[x][y] = value
+        self.update([(x, y) for x, y, _ in changes])
+
+    def flush(self):
+        if self.dirty_cells:
+            pygame.display.update([self.draw_cell(x, y) for x, y in self.dirty_cells])
+            self.dirty_cells.clear()
+        pygame.event.pump()
+        self.last_frame_time = time.perf_counter()
 
     def draw_unknown_cells(self):
         for x in range(self.size_x):
             for y in range(self.size_y):
-                if self.nonogram.grid[x][y] == UNKNOWN:
-                    text_surface = self.text_font.render('?', True, BLACK_COLOR)
+                if self.grid[x][y] == UNKNOWN:
+                    text_surface = self.get_glyph('?')
                     text_size_x, text_size_y = text_surface.get_size()
                     self.display.blit(
                         text_surface,
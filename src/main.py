@@ -1,8 +1,10 @@
 import argparse
+import os
 import time
 
-from gui import GUI
-from nonogram import Nonogram
+from events import read_event_log, replay, solve_events
+from nonogram import CHECKPOINT_INTERVAL, GENERATORS, Nonogram
+from options import add_solver_arguments, get_solver_options
 
 
 def main():
@@ -10,13 +12,49 @@ def main():
     parser.add_argument('-n', default=25, type=int)
     parser.add_argument('-m', default=25, type=int)
     parser.add_argument('-d', '--density', default=0.6, type=float)
+    parser.add_argument('-g', '--generator', default='random', choices=GENERATORS)
+    add_solver_arguments(parser)
+    parser.add_argument('-j', '--processes', type=int, help="processes of the parallel search, one per CPU by default")
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="save the search to PATH from time to time, resume from it when it exists")
+    parser.add_argument('--checkpoint-interval', default=CHECKPOINT_INTERVAL, type=float, metavar='SECONDS')
+    parser.add_argument('--no-gui', action='store_true', help="solve without a window and print the grid")
+    parser.add_argument('--fps', default=60, type=float)
+    parser.add_argument('--record', help="write the solver events to a log")
+    parser.add_argument('--replay', help="replay an event log instead of solving")
+    parser.add_argument('--speed', type=float, help="events per second of the replay, as fast as possible by default")
     args = parser.parse_args()
 
+    if args.replay:
+        from gui import GUI
+        clues, events = read_event_log(args.replay)
+        gui = GUI(Nonogram(clues=clues), draw_crosses=True, fps=args.fps, from_events=True)
+        gui.draw()
+        replay(events, gui, args.speed)
+        gui.draw()
+        gui.draw_unknown_cells()
+        gui.wait_for_close()
+        return
+
     assert 1 <= args.n, "The number of columns should be strictly positive."
     assert 1 <= args.m, "The number of rows should be strictly positive."
     assert 0 <= args.density <= 1, "The density should be between 0 and 1."
+    assert 0 <= args.checkpoint_interval, "The checkpoint interval should be positive."
 
-    nonogram = Nonogram(n=args.n, m=args.m, density=args.density)
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        # The puzzle and the solver options are the ones of the checkpoint
+        nonogram = Nonogram.from_checkpoint(args.checkpoint, checkpoint_interval=args.checkpoint_interval)
+    else:
+        nonogram = Nonogram(
+            n=args.n,
+            m=args.m,
+            density=args.density,
+            generator=args.generator,
+            processes=args.processes,
+            checkpoint=args.checkpoint,
+            checkpoint_interval=args.checkpoint_interval,
+            **get_solver_options(args),
+        )
 
     density = (
         (sum(sum(clues) for clues in nonogram.vertical_clues) + sum(sum(clues) for clues in nonogram.horizontal_clues))
@@ -24,15 +62,30 @@ def main():
     )
     print(f"Density is {density:.2f}")
 
-    gui = GUI(nonogram, draw_crosses=True)
-    gui.draw()
-    nonogram.set_gui(gui)
+    gui = None
+    if not args.no_gui:
+        # pygame is only imported once a window is needed, the solver alone and its workers never load it
+        from gui import GUI
+        gui = GUI(nonogram, draw_crosses=True, fps=args.fps, from_events=True)
+        gui.draw()
 
     start = time.perf_counter()
 
-    nonogram.solve()
+    if gui is None and not args.record:
+        nonogram.solve()
+    else:
+        # The solve runs on its own thread, the GUI draws its events here as fast as it can keep up
+        for changes in solve_events(nonogram, record=args.record):
+            if gui is not None:
+                gui.emit(changes)
 
     print(f"It took {time.perf_counter() - start:.2f}s to solve")
+    stats = nonogram.lines_to_solve.get_stats()
+    print(f"{stats['scheduled']} lines scheduled, {stats['solved']} solved, {stats['changed']} changed the grid")
+
+    if gui is None:
+        print(nonogram)
+        return
 
     gui.draw()
     gui.draw_unknown_cells()
@@ -1,23 +1,90 @@
 import bisect
+import functools
+import heapq
 import itertools
+import operator
+import os
+import pickle
 import random
 import sys
-from contextlib import suppress
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager, nullcontext, suppress
 
 from constants import *
 
+LINE_SOLVERS = ('placements', 'dp', 'bitset')
+SEARCH_MODES = ('copy', 'trail', 'parallel')
+GENERATORS = ('random', 'unique', 'line_logic')
+ORIENTATIONS = ('vertical', 'horizontal')
+# Above this many cells left unknown by the deductions, the unique puzzle generator does not search for solutions
+MAX_SEARCHED_CELLS = 100
+# Outcomes of solve_with_status, a partial grid comes from a cancelled solve and a timed-out one from a spent budget
+SOLVE_STATUSES = ('solved', 'partial', 'contradiction', 'timed-out')
+
+CHECKPOINT_VERSION = 1
+# Seconds between two checkpoints of the trail search
+CHECKPOINT_INTERVAL = 5.0
+# Moves of the placement enumeration that count as one step of the budget
+PLACEMENT_CHECK_INTERVAL = 1000
+
+SolveResult = namedtuple('SolveResult', ('status', 'grid'))
+
 
 class Line:
-    def __init__(self, coordinates, clues, orientation):
-        self.coordinates = coordinates
+    # Lines only know their place on the board, the coordinates of their cells are computed when needed
+    __slots__ = (
+        'index', 'orientation', 'length', 'clues', 'clues_key', 'clues_length', 'clues_sum', 'unknown_count',
+        'filled', 'empty', 'full_mask', 'hash', 'score', 'bit', 'dependencies',
+    )
+
+    def __init__(self, length, clues, orientation, index, bit=0):
+        self.index = index
+        self.orientation = orientation
+        self.length = length
+        self.unknown_count = length
+        # Bit i of these masks is set when the i-th cell of the line is known to be filled or empty
+        self.filled = 0
+        self.empty = 0
+        self.full_mask = (1 << length) - 1
+        self.hash = hash((orientation, index))
+        self.score = 0.0
+        # Bit of the line among all the lines of the board, and the lines the known cells of this line were deduced
+        # from, when the dependencies are tracked
+        self.bit = bit
+        self.dependencies = 0
+        self.set_clues(clues)
+
+    def set_clues(self, clues):
         self.clues = clues
+        self.clues_key = tuple(clues)
         self.clues_length = len(clues)
         self.clues_sum = sum(clues)
-        self.unknown_count = len(coordinates)
-        self.orientation = orientation
-        self.score = 0.0
         self.compute_score()
 
+    def get_cell(self, i):
+        return (self.index, i) if self.orientation == 'vertical' else (i, self.index)
+
+    @property
+    def coordinates(self):
+        return [self.get_cell(i) for i in range(self.length)]
+
+    def set_value(self, i, value):
+        bit = 1 << i
+        if value == FILLED:
+            self.filled |= bit
+            self.empty &= ~bit
+        else:
+            self.empty |= bit
+            self.filled &= ~bit
+
+    def clear_value(self, i):
+        bit = 1 << i
+        self.filled &= ~bit
+        self.empty &= ~bit
+
     def compute_score(self):
         self.score = (
             0.75 * self.clues_sum
@@ -26,11 +93,329 @@ class Line:
         )
 
     def __hash__(self):
-        return hash(self.coordinates)
+        return self.hash
+
+
+class FlatGrid:
+    # Cells of the board in one array('b'), column after column. grid[x] is a view of column x, so grid[x][y] reads
+    # and writes like with a list of lists, and rows are read with a strided slice.
+    def __init__(self, size_x, size_y, cells=None):
+        self.size_x = size_x
+        self.size_y = size_y
+        self.cells = array('b', [UNKNOWN]) * (size_x * size_y) if cells is None else cells
+        view = memoryview(self.cells)
+        self.columns = [view[x * size_y:(x + 1) * size_y] for x in range(size_x)]
+
+    def __getitem__(self, x):
+        return self.columns[x]
+
+    def __len__(self):
+        return self.size_x
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def get_row(self, y):
+        return self.cells[y::self.size_y].tolist()
+
+    def copy(self):
+        return FlatGrid(self.size_x, self.size_y, array('b', self.cells))
+
+
+class LineQueue:
+    def __init__(self):
+        # Entries are (-score, -insertion order, line), an entry is stale when its score is not the queued one.
+        # The queued lines are the keys of queued_scores, iterated in the order they were queued, whatever their hash.
+        self.heap = []
+        self.queued_scores = {}
+        self.counter = 0
+        self.scheduled_count = 0
+        self.solved_count = 0
+        self.changed_count = 0
+
+    def __len__(self):
+        return len(self.queued_scores)
+
+    def __contains__(self, line):
+        return line in self.queued_scores
+
+    def __iter__(self):
+        return iter(list(self.queued_scores))
+
+    def push(self, line):
+        if line not in self.queued_scores:
+            self.scheduled_count += 1
+        elif self.queued_scores[line] == line.score:
+            return
+        self.queued_scores[line] = line.score
+        self.counter += 1
+        heapq.heappush(self.heap, (-line.score, -self.counter, line))
+
+    def pop(self):
+        while True:
+            score, _, line = heapq.heappop(self.heap)
+            if -score != self.queued_scores.get(line):
+                continue
+            if line.score != -score:
+                # The score changed without the line being pushed again
+                self.queued_scores[line] = line.score
+                self.counter += 1
+                heapq.heappush(self.heap, (-line.score, -self.counter, line))
+                continue
+            del self.queued_scores[line]
+            self.solved_count += 1
+            return line
+
+    def discard(self, line):
+        self.queued_scores.pop(line, None)
+        if not self.queued_scores:
+            self.heap.clear()
+
+    def clear(self):
+        self.heap.clear()
+        self.queued_scores.clear()
+
+    def get_stats(self):
+        return {
+            'scheduled': self.scheduled_count,
+            'solved': self.solved_count,
+            'changed': self.changed_count,
+        }
+
+
+class LineCache:
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def get_line_key(clues, values):
+        # A line and its mirror image share the same entry, the smallest of both is the key
+        clues, values = tuple(clues), tuple(values)
+        reversed_clues, reversed_values = clues[::-1], values[::-1]
+        if (reversed_clues, reversed_values) < (clues, values):
+            return (reversed_clues, reversed_values), True
+        return (clues, values), False
+
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_line(self, clues, values):
+        key, is_reversed = self.get_line_key(clues, values)
+        result = self.get(key)
+        if result is not None and is_reversed:
+            return result[::-1]
+        return result
+
+    def put_line(self, clues, values, new_values):
+        key, is_reversed = self.get_line_key(clues, values)
+        self.put(key, tuple(new_values[::-1] if is_reversed else new_values))
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, path):
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+            pickle.dump((self.max_entries, list(self.entries.items())), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path, max_entries=None):
+        with open(path, 'rb') as file:
+            saved_max_entries, entries = pickle.load(file)
+        cache = cls(max_entries if max_entries is not None else saved_max_entries)
+        for key, result in entries[-cache.max_entries:]:
+            cache.entries[key] = result
+        return cache
+
+
+class SolverStats:
+    def __init__(self, cache, hook=None):
+        # The hook is called as hook(event, data) on 'line_solve', 'guess' and 'backtrack' events
+        self.hook = hook
+        self.cache = cache
+        self.cache_hits_start = cache.hits
+        self.cache_misses_start = cache.misses
+        self.phase_times = {}
+        self.line_solver_calls = {}
+        self.cells_deduced = {}
+        self.depth_histogram = {}
+        self.guesses = 0
+        self.backtracks = 0
+
+    @contextmanager
+    def measure(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def add_time(self, phase, duration):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + duration
+
+    def add_deduced_cells(self, phase, count):
+        self.cells_deduced[phase] = self.cells_deduced.get(phase, 0) + count
+
+    def record_line_solve(self, line, solver, deduced):
+        self.line_solver_calls[solver] = self.line_solver_calls.get(solver, 0) + 1
+        self.add_deduced_cells(solver, deduced)
+        if self.hook:
+            self.hook('line_solve', {'line': (line.orientation, line.index), 'solver': solver, 'deduced': deduced})
+
+    def record_guess(self, line, depth):
+        self.guesses += 1
+        self.depth_histogram[depth] = self.depth_histogram.get(depth, 0) + 1
+        if self.hook:
+            self.hook('guess', {'line': (line.orientation, line.index), 'depth': depth})
+
+    def record_backtrack(self, line, depth):
+        self.backtracks += 1
+        if self.hook:
+            self.hook('backtrack', {'line': (line.orientation, line.index), 'depth': depth})
+
+    def to_dict(self):
+        hits = self.cache.hits - self.cache_hits_start
+        misses = self.cache.misses - self.cache_misses_start
+        return {
+            'phase_times': dict(self.phase_times),
+            'line_solver_calls': dict(self.line_solver_calls),
+            'cells_deduced': dict(self.cells_deduced),
+            'depth_histogram': {str(depth): count for depth, count in sorted(self.depth_histogram.items())},
+            'guesses': self.guesses,
+            'backtracks': self.backtracks,
+            'cache': {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            },
+        }
+
+
+class SearchSplit(Exception):
+    # Raised by a search over its node budget, with snapshots of grids that together hold the unexplored part of it
+    def __init__(self, snapshots):
+        super().__init__()
+        self.snapshots = snapshots
+
+
+class SolveInterrupted(Exception):
+    # Raised when the time or step budget runs out or the solve is cancelled, the grid goes back to its deductions
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+class CancellationToken:
+    # Shared with the thread running a solve, cancel() stops it at its next check
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class BranchingStrategy:
+    def get_branches(self, nonogram, lines):
+        # Return the line to guess on and the values to try on it, one per branch
+        raise NotImplementedError
+
+
+class FewestPlacementsStrategy(BranchingStrategy):
+    def get_branches(self, nonogram, lines):
+        line_to_solve, _ = nonogram.get_most_constrained_line(lines)
+        return line_to_solve, nonogram.get_line_placements(line_to_solve)
+
+
+class MostConstrainedCellStrategy(BranchingStrategy):
+    def __init__(self, cap=1000):
+        self.cap = cap
+
+    def get_branches(self, nonogram, lines):
+        counts = {
+            line: nonogram.count_placements(line.clues, nonogram.get_line_values(line), cap=self.cap)
+            for line in lines
+        }
+        best_cell = None
+        best_key = None
+        for line in lines:
+            if line.orientation != 'vertical':
+                continue
+            for i, value in enumerate(nonogram.get_line_values(line)):
+                if value != UNKNOWN:
+                    continue
+                crossing_line, _ = nonogram.get_crossing_line(line, i)
+                key = sorted((counts[line], counts.get(crossing_line, self.cap)))
+                if best_key is None or key < best_key:
+                    best_cell, best_key = (line, i), key
+
+        line_to_solve, i = best_cell
+        values = nonogram.get_line_values(line_to_solve)
+        branches = []
+        for value in (FILLED, EMPTY):
+            values[i] = value
+            branches.append(values[:])
+        return line_to_solve, branches
+
+
+BRANCHING_STRATEGIES = {
+    'fewest_placements': FewestPlacementsStrategy,
+    'most_constrained_cell': MostConstrainedCellStrategy,
+}
 
 
 class Nonogram:
-    def __init__(self, clues=None, n=15, m=15, density=.5, seed=None):
+    def __init__(self, clues=None, n=15, m=15, density=.5, seed=None, line_solver='bitset', search='trail', probing=False,
+                 branching='fewest_placements', cache=None, stats=False, hook=None, generator='random', processes=None,
+                 decompose=False, compact=False, vectorized=False, timeout=None, max_steps=None, token=None,
+                 incremental=False, checkpoint=None, checkpoint_interval=CHECKPOINT_INTERVAL):
+        if line_solver not in LINE_SOLVERS:
+            raise ValueError(f"Unknown line solver '{line_solver}', expected one of {LINE_SOLVERS}")
+        if search not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search}', expected one of {SEARCH_MODES}")
+        if generator not in GENERATORS:
+            raise ValueError(f"Unknown generator '{generator}', expected one of {GENERATORS}")
+        if checkpoint is not None and (search != 'trail' or decompose):
+            raise ValueError("Checkpoints are only written by the trail search, without decompose")
+        if vectorized:
+            # Imported here, NumPy is only needed by the vectorized sweeps
+            import sweeps
+            if sweeps.np is None:
+                raise ValueError("The vectorized sweeps need NumPy")
         if clues is None:
             if seed:
                 random.seed(seed)
@@ -38,85 +423,178 @@ class Nonogram:
                 seed = random.randrange(sys.maxsize)
                 random.seed(seed)
                 print(f"Seed is: {seed}")
-            self.vertical_clues, self.horizontal_clues = self.generate_random_clues(n, m, density)
+            if generator == 'random':
+                self.vertical_clues, self.horizontal_clues = self.generate_random_clues(n, m, density)
+            else:
+                self.vertical_clues, self.horizontal_clues = self.generate_unique_clues(n, m, density, generator == 'line_logic', cache)
         else:
             self.vertical_clues = clues[0]
             self.horizontal_clues = clues[1]
         self.size_x = len(self.vertical_clues)
         self.size_y = len(self.horizontal_clues)
-        self.grid = [[UNKNOWN for _ in range(self.size_y)] for _ in range(self.size_x)]
-        self.lines_to_solve = []
-        self.lines_to_solve_set = set()
-        self.cache = {}
+        self.compact = compact
+        if compact:
+            self.grid = FlatGrid(self.size_x, self.size_y)
+        else:
+            self.grid = [[UNKNOWN] * self.size_y for _ in range(self.size_x)]
+        self.lines_to_solve = LineQueue()
+        # Lines each known cell was deduced from, as a bitmask, so that set_clues keeps the cells a change leaves valid.
+        # Only line solving outside of the search is tracked, 0 stands for a guessed or probed cell.
+        self.dependencies = [[0] * self.size_y for _ in range(self.size_x)] if incremental else None
+        self.tracking = False
+        self.edited = False
+        self.cache = cache if cache is not None else LineCache()
+        # Instrumentation is off unless asked for, every probe checks it is not None first
+        self.stats = SolverStats(self.cache, hook) if stats or hook else None
+        self.search_depth = 0
         self.horizontal_lines = []
         self.vertical_lines = []
         for x in range(self.size_x):
-            line = Line(tuple((x, y) for y in range(self.size_y)), self.vertical_clues[x], 'vertical')
+            line = Line(self.size_y, self.vertical_clues[x], 'vertical', x, 1 << x)
             self.add_line_to_solve(line)
             self.vertical_lines.append(line)
         for y in range(self.size_y):
-            line = Line(tuple((x, y) for x in range(self.size_x)), self.horizontal_clues[y], 'horizontal')
+            line = Line(self.size_x, self.horizontal_clues[y], 'horizontal', y, 1 << (self.size_x + y))
             self.add_line_to_solve(line)
             self.horizontal_lines.append(line)
+        self.line_solver = {
+            'placements': self.solve_for_values,
+            'dp': self.dp_solve_for_values,
+            'bitset': self.bitset_solve_for_values,
+        }[line_solver]
+        self.search_mode = search
+        self.probing = probing
+        self.processes = processes
+        self.decompose = decompose
+        self.vectorized = vectorized
+        # Options a solver of a subproblem of this puzzle is built with, in another process
+        self.options = {'line_solver': line_solver, 'probing': probing, 'branching': branching, 'compact': compact,
+                        'vectorized': vectorized}
+        # Once the search went through that many nodes, it stops and raises SearchSplit
+        self.node_budget = None
+        self.node_count = 0
+        # Seconds and steps, line solves and guesses, a solve may take before it raises SolveInterrupted
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.token = token
+        self.bounded = timeout is not None or max_steps is not None or token is not None
+        self.deadline = None
+        self.step_count = 0
+        # Path of the checkpoint file of the trail search, the search resumes from it when it exists
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+        self.next_checkpoint = None
+        # Grid when the search started, and the index of the branch taken at each depth of the search
+        self.search_root = None
+        self.search_path = []
+        # Branch indices to go back down to when resuming, the earlier branches of each depth were already searched
+        self.resume_path = None
+        # Path of the search when it was interrupted, kept before the stack unwinds and pops it
+        self.interrupted_path = None
+        if isinstance(branching, BranchingStrategy):
+            self.branching = branching
+        elif branching in BRANCHING_STRATEGIES:
+            self.branching = BRANCHING_STRATEGIES[branching]()
+        else:
+            raise ValueError(f"Unknown branching strategy '{branching}', expected one of {tuple(BRANCHING_STRATEGIES)}")
+        # Cells assigned since the search started, as (line, index in the line, previous value)
+        self.trail = None
         self.gui = None
+        # Consumer of the cell-change events, see events.py
+        self.events = None
+        self.observed = False
+        # Cells changed since the GUI and the event consumer were last told about it
+        self.changed_cells = []
 
     @staticmethod
-    def generate_random_clues(n, m, density):
-        filled_indices = set(random.sample(range(n * m), round(density * n * m)))
-        grid = [[EMPTY if j * n + i not in filled_indices else FILLED for i in range(n)] for j in range(m)]
-        horizontal_clues = []
-        for i in range(m):
-            count_filled = 0
-            clues = []
-            for j in range(n):
-                if grid[i][j] == FILLED:
-                    count_filled += 1
-                else:
-                    if count_filled != 0:
-                        clues.append(count_filled)
-                    count_filled = 0
-            if count_filled:
-                clues.append(count_filled)
-            horizontal_clues.append(clues)
-
-        vertical_clues = []
-        for i in range(n):
-            count_filled = 0
-            clues = []
-            for j in range(m):
-                if grid[j][i] == FILLED:
-                    count_filled += 1
-                else:
-                    if count_filled != 0:
-                        clues.append(count_filled)
-                    count_filled = 0
-            if count_filled:
-                clues.append(count_filled)
-            vertical_clues.append(clues)
+    def generate_random_cells(n, m, density):
+        # Row-major bytes with a 1 for every filled cell
+        cells = bytearray(n * m)
+        for index in random.sample(range(n * m), round(density * n * m)):
+            cells[index] = 1
+        return cells
+
+    @staticmethod
+    def generate_independent_cells(n, m, density):
+        # Every cell filled with probability density, a lookup table turns random bytes into cells in C
+        table = bytes(1 if byte < round(density * 256) else 0 for byte in range(256))
+        return bytearray(random.randbytes(n * m).translate(table))
+
+    @staticmethod
+    def get_clues_from_cells(cells):
+        # Run-length encoding done by bytes.split, in C, rather than cell by cell
+        return [len(run) for run in cells.split(b'\x00') if run]
+
+    @staticmethod
+    def get_clues_from_grid(cells, n, m):
+        vertical_clues = [Nonogram.get_clues_from_cells(cells[x::n]) for x in range(n)]
+        horizontal_clues = [Nonogram.get_clues_from_cells(cells[y * n:(y + 1) * n]) for y in range(m)]
         return vertical_clues, horizontal_clues
 
+    @staticmethod
+    def generate_random_clues(n, m, density):
+        return Nonogram.get_clues_from_grid(Nonogram.generate_random_cells(n, m, density), n, m)
+
+    def get_ambiguous_cells(self, line_logic_only, max_searched_cells=MAX_SEARCHED_CELLS):
+        # Cells to repair, empty once the puzzle has a unique solution. The cells left unknown by the deductions are
+        # only searched for two distinct solutions when there are few of them, else they are all considered ambiguous.
+        self.deduce()
+        unknown_cells = [(x, y) for x in range(self.size_x) for y in range(self.size_y) if self.grid[x][y] == UNKNOWN]
+        if line_logic_only or not unknown_cells or len(unknown_cells) > max_searched_cells:
+            return unknown_cells
+        count, solutions = self.search_solutions(2)
+        if count < 2:
+            return []
+        first, second = solutions
+        return [(x, y) for y, (row, other_row) in enumerate(zip(first, second)) for x in range(len(row)) if row[x] != other_row[x]]
+
+    @staticmethod
+    def generate_unique_clues(n, m, density, line_logic_only=False, cache=None):
+        cells = Nonogram.generate_independent_cells(n, m, density)
+        # A single solver for the whole repair, set_clues only clears the cells deduced from the flipped lines
+        nonogram = Nonogram(clues=Nonogram.get_clues_from_grid(cells, n, m), probing=not line_logic_only, cache=cache,
+                            incremental=True)
+        # Flip some ambiguous cells, only their rows and columns clues change, until the solution is unique.
+        # Empty cells are flipped first, filling them leaves fewer placements to their lines than emptying a filled one.
+        while ambiguous_cells := nonogram.get_ambiguous_cells(line_logic_only):
+            ambiguous_cells = [(x, y) for x, y in ambiguous_cells if not cells[y * n + x]] or ambiguous_cells
+            for x, y in random.sample(ambiguous_cells, max(1, len(ambiguous_cells) // 16)):
+                cells[y * n + x] ^= 1
+                nonogram.set_clues('vertical', x, Nonogram.get_clues_from_cells(cells[x::n]))
+                nonogram.set_clues('horizontal', y, Nonogram.get_clues_from_cells(cells[y * n:(y + 1) * n]))
+        return nonogram.vertical_clues, nonogram.horizontal_clues
+
     def set_gui(self, gui):
         self.gui = gui
+        self.observed = True
         self.gui.draw()
 
+    def set_events(self, events):
+        self.events = events
+        self.observed = events is not None or self.gui is not None
+
     def add_line_to_solve(self, line):
-        if line not in self.lines_to_solve_set:
-            self.lines_to_solve.append(line)
-            self.lines_to_solve_set.add(line)
+        self.lines_to_solve.push(line)
 
     def get_next_line_to_solve(self):
-        self.lines_to_solve.sort(key=lambda l: l.score)
-        line = self.lines_to_solve.pop()
-        self.lines_to_solve_set.remove(line)
-        return line
+        return self.lines_to_solve.pop()
+
+    @staticmethod
+    def get_clues_from_values(values):
+        return [len(run) for run in ''.join('1' if value == FILLED else '0' for value in values).split('0') if run]
 
     @staticmethod
     def get_unsolved_part(clues, values):
         if UNKNOWN not in values:
-            return clues, values, (len(clues), 0), (len(values), 0)
+            if Nonogram.get_clues_from_values(values) != list(clues):
+                raise AssertionError
+            return clues, values, (len(clues), len(clues)), (len(values), len(values))
 
         if sum(1 for value in values if value == FILLED) == sum(clues):
-            return clues, [EMPTY if value == UNKNOWN else value for value in values], (len(clues), 0), (len(values), 0)
+            values = [EMPTY if value == UNKNOWN else value for value in values]
+            if Nonogram.get_clues_from_values(values) != list(clues):
+                raise AssertionError
+            return clues, values, (len(clues), len(clues)), (len(values), len(values))
 
         values_copy = values[:]
 
@@ -148,7 +626,8 @@ class Nonogram:
         return clues, values_copy, (clues_start, clues_end), (values_start, values_end)
 
     @staticmethod
-    def get_placements(clues, values):
+    def get_placements(clues, values, check=None):
+        # check is called every PLACEMENT_CHECK_INTERVAL moves, long lines can have millions of placements
         already_filled_cells = [i for i, value in enumerate(values) if value == FILLED]
         possible_placements = []
         clues_start = [0]
@@ -159,7 +638,12 @@ class Nonogram:
         clues_length = len(clues)
         clues_start_limits = [values_length - sum(clues[i:]) - clues_length + i + 1 for i in range(clues_length + 1)]
 
+        moves = 0
         while clues_start[0] <= clues_start_limits[0]:
+            if check is not None:
+                moves += 1
+                if moves % PLACEMENT_CHECK_INTERVAL == 0:
+                    check()
             clue_start = clues_start[clue_index]
             clue_end = clue_start + clues[clue_index]
             if (
@@ -187,14 +671,38 @@ class Nonogram:
                 clues_start[clue_index] += 1
         return possible_placements
 
+    @staticmethod
+    def count_placements(clues, values, cap=None):
+        values_length = len(values)
+        empty_prefix = [0]
+        for value in values:
+            empty_prefix.append(empty_prefix[-1] + (value == EMPTY))
+
+        # ways[i] is the number of placements of the clues seen so far in values[:i]
+        ways = [1] * (values_length + 1)
+        for i in range(values_length):
+            ways[i + 1] = ways[i] if values[i] != FILLED else 0
+        for clue in clues:
+            previous, ways = ways, [0] * (values_length + 1)
+            for i in range(clue, values_length + 1):
+                start = i - clue
+                count = ways[i - 1] if values[i - 1] != FILLED else 0
+                if empty_prefix[i] == empty_prefix[start]:
+                    if start == 0:
+                        count += previous[0]
+                    elif values[start - 1] != FILLED:
+                        count += previous[start - 1]
+                ways[i] = count if cap is None or count < cap else cap
+            if not any(ways):
+                return 0
+        return ways[values_length]
+
     def solve_for_values(self, clues, values):
         if not values:
             return values
 
         values = tuple(values)
         clues = tuple(clues)
-        if (clues, values) in self.cache:
-            return self.cache[(clues, values)]
 
         # Find all possible placements
         possible_placements = self.get_placements(clues, values)
@@ -209,11 +717,209 @@ class Nonogram:
                 else:
                     new_values.append(UNKNOWN)
 
-            self.cache[(clues, values)] = new_values[:]
             return new_values
         else:
             raise AssertionError
 
+    @staticmethod
+    def get_line_reachability(clues, values):
+        values_length = len(values)
+        clues_length = len(clues)
+        empty_prefix = [0]
+        for value in values:
+            empty_prefix.append(empty_prefix[-1] + (value == EMPTY))
+
+        # left[j][i] is True when the first j clues fit in values[:i]
+        left = [[False] * (values_length + 1) for _ in range(clues_length + 1)]
+        left[0][0] = True
+        for i in range(values_length):
+            left[0][i + 1] = left[0][i] and values[i] != FILLED
+        for j, clue in enumerate(clues, 1):
+            previous, current = left[j - 1], left[j]
+            for i in range(clue, values_length + 1):
+                start = i - clue
+                current[i] = (
+                    (current[i - 1] and values[i - 1] != FILLED)
+                    or (
+                        empty_prefix[i] == empty_prefix[start]
+                        and (previous[0] if start == 0 else previous[start - 1] and values[start - 1] != FILLED)
+                    )
+                )
+
+        # right[j][i] is True when the clues from j onward fit in values[i:]
+        right = [[False] * (values_length + 1) for _ in range(clues_length + 1)]
+        right[clues_length][values_length] = True
+        for i in reversed(range(values_length)):
+            right[clues_length][i] = right[clues_length][i + 1] and values[i] != FILLED
+        for j in reversed(range(clues_length)):
+            clue = clues[j]
+            following, current = right[j + 1], right[j]
+            for i in reversed(range(values_length - clue + 1)):
+                end = i + clue
+                current[i] = (
+                    (current[i + 1] and values[i] != FILLED)
+                    or (
+                        empty_prefix[end] == empty_prefix[i]
+                        and (following[end] if end == values_length else following[end + 1] and values[end] != FILLED)
+                    )
+                )
+
+        return left, right, empty_prefix
+
+    def dp_solve_for_values(self, clues, values):
+        if not values:
+            return values
+
+        values = tuple(values)
+        clues = tuple(clues)
+
+        values_length = len(values)
+        left, right, empty_prefix = self.get_line_reachability(clues, values)
+        if not left[len(clues)][values_length]:
+            raise AssertionError
+
+        # Mark cells covered by at least one valid position of a clue
+        coverage = [0] * (values_length + 1)
+        for j, clue in enumerate(clues):
+            previous, following = left[j], right[j + 1]
+            for start in range(values_length - clue + 1):
+                end = start + clue
+                if (
+                    empty_prefix[end] == empty_prefix[start]
+                    and (previous[0] if start == 0 else previous[start - 1] and values[start - 1] != FILLED)
+                    and (following[end] if end == values_length else following[end + 1] and values[end] != FILLED)
+                ):
+                    coverage[start] += 1
+                    coverage[end] -= 1
+
+        # Cells that can be left empty between two consecutive clues
+        new_values = []
+        covered = 0
+        for i, value in enumerate(values):
+            covered += coverage[i]
+            can_be_empty = value != FILLED and any(left[j][i] and right[j][i + 1] for j in range(len(clues) + 1))
+            if covered and not can_be_empty:
+                new_values.append(FILLED)
+            elif can_be_empty and not covered:
+                new_values.append(EMPTY)
+            else:
+                new_values.append(UNKNOWN)
+
+        return new_values
+
+    @staticmethod
+    def values_to_masks(values):
+        filled = empty = 0
+        for i, value in enumerate(values):
+            if value == FILLED:
+                filled |= 1 << i
+            elif value == EMPTY:
+                empty |= 1 << i
+        return filled, empty
+
+    @staticmethod
+    def reverse_mask(mask, length):
+        return int(f'{mask:0{length}b}'[::-1], 2) if length else 0
+
+    @staticmethod
+    def get_window_mask(mask, size):
+        # Bit i is kept when bits i to i + size - 1 are all set in mask
+        window, covered = mask, 1
+        while covered < size:
+            shift = min(covered, size - covered)
+            window &= window >> shift
+            covered += shift
+        return window
+
+    @staticmethod
+    def extend_mask(mask, size):
+        # Set bits i to i + size - 1 for every bit i of mask
+        extended, covered = mask, 1
+        while covered < size:
+            shift = min(covered, size - covered)
+            extended |= extended << shift
+            covered += shift
+        return extended
+
+    @staticmethod
+    def spread_mask(mask, propagate, length):
+        # Move every bit of mask to the left as long as it lands on bits of propagate
+        shift = 1
+        while shift <= length:
+            mask |= (mask << shift) & propagate
+            propagate &= propagate << shift
+            shift <<= 1
+        return mask
+
+    @staticmethod
+    def get_mask_reachability(clues, can_fill, can_empty, length):
+        # Bit i of reachable[j] is set when the first j clues fit in the first i cells,
+        # bit s of starts[j] is set when the clue j can start at cell s given the clues before it
+        propagate = (can_empty << 1) & ((1 << (length + 1)) - 1)
+        reachable = [Nonogram.spread_mask(1, propagate, length)]
+        starts = []
+        for j, clue in enumerate(clues):
+            clue_starts = reachable[-1] if j == 0 else (reachable[-1] & can_empty) << 1
+            clue_starts &= Nonogram.get_window_mask(can_fill, clue)
+            starts.append(clue_starts)
+            reachable.append(Nonogram.spread_mask(clue_starts << clue, propagate, length))
+        return reachable, starts
+
+    @staticmethod
+    def get_masks_key(clues, filled, empty, length):
+        # Cache key of a line for the bitset solver, with the empty cells on both of its ends trimmed so that shifted
+        # lines share an entry, and like in LineCache.get_line_key a line and its mirror image share the smallest key.
+        # Returns the key, the number of cells trimmed at the start and whether the key is the mirror image.
+        unset = ((1 << length) - 1) & ~empty
+        start = 0
+        if unset:
+            start = (unset & -unset).bit_length() - 1
+            length = unset.bit_length() - start
+            filled >>= start
+            empty = (empty >> start) & ((1 << length) - 1)
+        key = (clues, length, filled, empty)
+        # The masks are only mirrored when the clues do not already tell which key is the smallest
+        reversed_clues = clues[::-1]
+        if clues < reversed_clues:
+            return key, start, False
+        reversed_key = (reversed_clues, length, Nonogram.reverse_mask(filled, length), Nonogram.reverse_mask(empty, length))
+        if reversed_key < key:
+            return reversed_key, start, True
+        return key, start, False
+
+    @staticmethod
+    def bitset_solve_for_values(clues, filled, empty, length):
+        full = (1 << length) - 1
+        can_fill = full & ~empty
+        can_empty = full & ~filled
+        clues_length = len(clues)
+
+        left, starts = Nonogram.get_mask_reachability(clues, can_fill, can_empty, length)
+        if not left[clues_length] >> length & 1:
+            raise AssertionError
+
+        # Bit i of right[j] is set when the clues from j onward fit in the cells from i onward
+        reversed_left, _ = Nonogram.get_mask_reachability(
+            clues[::-1],
+            Nonogram.reverse_mask(can_fill, length),
+            Nonogram.reverse_mask(can_empty, length),
+            length,
+        )
+        right = [Nonogram.reverse_mask(mask, length + 1) for mask in reversed(reversed_left)]
+
+        can_be_empty = 0
+        for j in range(clues_length + 1):
+            can_be_empty |= left[j] & (right[j] >> 1)
+        can_be_empty &= can_empty
+
+        can_be_filled = 0
+        last_position = 1 << length
+        for j, clue in enumerate(clues):
+            ends = ((right[j + 1] >> 1) & can_empty) | (right[j + 1] & last_position)
+            can_be_filled |= Nonogram.extend_mask(starts[j] & (ends >> clue), clue)
+
+        return can_be_filled & ~can_be_empty, can_be_empty & ~can_be_filled
+
     @staticmethod
     def optimized_solve_for_values(clues, values):
         if not values:
@@ -303,80 +1009,764 @@ class Nonogram:
 
         return new_values
 
-    def is_unsolved(self, line):
-        return any(self.grid[x][y] == UNKNOWN for x, y in line.coordinates)
+    @staticmethod
+    def is_unsolved(line):
+        return line.filled | line.empty != line.full_mask
 
-    def update_grid_from_values(self, line, values):
-        for i, (x, y) in enumerate(line.coordinates):
-            if values[i] != UNKNOWN and self.grid[x][y] != values[i]:
-                line.unknown_count -= 1
-                new_line_to_solve = self.horizontal_lines[i] if line.orientation == 'vertical' else self.vertical_lines[i]
-                new_line_to_solve.unknown_count -= 1
-                new_line_to_solve.compute_score()
-                if self.is_unsolved(new_line_to_solve):
-                    self.add_line_to_solve(new_line_to_solve)
-                self.grid[x][y] = values[i]
-        line.compute_score()
+    def get_crossing_line(self, line, i):
+        if line.orientation == 'vertical':
+            return self.horizontal_lines[i], line.index
+        return self.vertical_lines[i], line.index
+
+    def set_cell(self, line, i, value):
+        x, y = line.get_cell(i)
+        crossing_line, crossing_i = self.get_crossing_line(line, i)
+        if self.trail is not None:
+            self.trail.append((line, i, self.grid[x][y]))
+        line.unknown_count -= 1
+        crossing_line.unknown_count -= 1
+        crossing_line.compute_score()
+        if self.is_unsolved(crossing_line):
+            self.add_line_to_solve(crossing_line)
+        line.set_value(i, value)
+        crossing_line.set_value(crossing_i, value)
+        self.grid[x][y] = value
+        if self.tracking:
+            # The cell follows from the clues of its line and the cells of the line known before
+            dependencies = line.dependencies | line.bit
+            line.dependencies = dependencies
+            crossing_line.dependencies |= dependencies
+            self.dependencies[x][y] = dependencies
+        if self.observed:
+            self.changed_cells.append((x, y))
+
+    def publish_changes(self):
+        if self.changed_cells:
+            if self.gui:
+                self.gui.update(self.changed_cells)
+            if self.events:
+                self.events.emit(tuple((x, y, self.grid[x][y]) for x, y in self.changed_cells))
+            self.changed_cells = []
+
+    def publish_grid(self):
+        # Send the whole grid after it was replaced rather than changed cell by cell
+        self.changed_cells = []
         if self.gui:
             self.gui.draw()
+        if self.events:
+            self.events.emit(tuple((x, y, self.grid[x][y]) for x in range(self.size_x) for y in range(self.size_y)))
 
-    def solve(self):
-        for solve_function in (self.optimized_solve_for_values, self.solve_for_values):
-            while self.lines_to_solve:
-                line = self.get_next_line_to_solve()
-
-                clues = line.clues
-                values = [self.grid[x][y] for x, y in line.coordinates]
-
-                _clues, _values, (clues_start, clues_end), (values_start, values_end) = Nonogram.get_unsolved_part(clues, values)
-                new_values = (
-                    *_values[:values_start],
-                    *solve_function(_clues[clues_start:clues_end], _values[values_start:values_end]),
-                    *_values[values_end:],
-                )
-                if new_values != values:
+    def update_grid_from_values(self, line, values):
+        for i, value in enumerate(self.get_line_values(line)):
+            if values[i] != UNKNOWN and value != values[i]:
+                # A known cell never changes, new values that disagree with it are a contradiction
+                if value != UNKNOWN:
+                    raise AssertionError
+                self.set_cell(line, i, values[i])
+        line.compute_score()
+        self.publish_changes()
+
+    def update_grid_from_masks(self, line, filled, empty):
+        changed = (filled & ~line.filled) | (empty & ~line.empty)
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            self.set_cell(line, bit.bit_length() - 1, FILLED if filled & bit else EMPTY)
+        line.compute_score()
+        self.publish_changes()
+
+    def solve_line(self, line, solve_function):
+        if solve_function == self.bitset_solve_for_values:
+            key, start, is_reversed = self.get_masks_key(line.clues_key, line.filled, line.empty, line.length)
+            clues, length, filled, empty = key
+            cached = self.cache.get(key)
+            if cached is None:
+                cached = solve_function(clues, filled, empty, length)
+                self.cache.put(key, cached)
+            filled, empty = cached
+            if is_reversed:
+                filled, empty = self.reverse_mask(filled, length), self.reverse_mask(empty, length)
+            filled <<= start
+            empty = empty << start | line.empty
+            if filled != line.filled or empty != line.empty:
+                self.update_grid_from_masks(line, filled, empty)
+                return True
+            return False
+
+        clues = line.clues
+        values = self.get_line_values(line)
+
+        if self.stats is None:
+            _clues, _values, (clues_start, clues_end), (values_start, values_end) = Nonogram.get_unsolved_part(clues, values)
+        else:
+            start = time.perf_counter()
+            _clues, _values, (clues_start, clues_end), (values_start, values_end) = Nonogram.get_unsolved_part(clues, values)
+            self.stats.add_time('get_unsolved_part', time.perf_counter() - start)
+        unsolved_clues, unsolved_values = _clues[clues_start:clues_end], _values[values_start:values_end]
+        if solve_function == self.optimized_solve_for_values or not unsolved_values:
+            solved_values = solve_function(unsolved_clues, unsolved_values)
+        else:
+            solved_values = self.cache.get_line(unsolved_clues, unsolved_values)
+            if solved_values is None:
+                solved_values = solve_function(unsolved_clues, unsolved_values)
+                self.cache.put_line(unsolved_clues, unsolved_values, solved_values)
+        new_values = (
+            *_values[:values_start],
+            *solved_values,
+            *_values[values_end:],
+        )
+        if solve_function == self.optimized_solve_for_values and UNKNOWN not in new_values:
+            # The quick pass can complete a line that does not fit its clues, and a complete line is not solved again
+            if self.get_clues_from_values(new_values) != list(clues):
+                raise AssertionError
+        if new_values != tuple(values):
+            self.update_grid_from_values(line, new_values)
+            return True
+        return False
+
+    def propagate(self, solve_function):
+        stats = self.stats
+        while self.lines_to_solve:
+            if self.bounded:
+                self.check_budget()
+            line = self.get_next_line_to_solve()
+            if stats is None:
+                changed = self.solve_line(line, solve_function)
+            else:
+                unknown_count = line.unknown_count
+                changed = self.solve_line(line, solve_function)
+                stats.record_line_solve(line, solve_function.__name__, unknown_count - line.unknown_count)
+            if changed:
+                self.lines_to_solve.changed_count += 1
+
+    def measure(self, phase):
+        return self.stats.measure(phase) if self.stats else nullcontext()
+
+    def start_budget(self):
+        self.deadline = time.perf_counter() + self.timeout if self.timeout is not None else None
+        self.step_count = 0
+
+    def check_budget(self):
+        self.step_count += 1
+        if self.max_steps is not None and self.step_count > self.max_steps:
+            raise SolveInterrupted('timed-out')
+        self.check_interruption()
+
+    def check_interruption(self):
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SolveInterrupted('timed-out')
+        if self.token is not None and self.token.cancelled:
+            raise SolveInterrupted('partial')
+
+    def get_stats(self):
+        stats = self.stats.to_dict() if self.stats else {}
+        stats['scheduler'] = self.lines_to_solve.get_stats()
+        stats['cache_total'] = self.cache.get_stats()
+        return stats
+
+    def undo(self, mark):
+        while len(self.trail) > mark:
+            line, i, value = self.trail.pop()
+            x, y = line.get_cell(i)
+            self.grid[x][y] = value
+            if self.observed:
+                self.changed_cells.append((x, y))
+            crossing_line, crossing_i = self.get_crossing_line(line, i)
+            for undone_line, undone_i in ((line, i), (crossing_line, crossing_i)):
+                undone_line.unknown_count += 1
+                if value == UNKNOWN:
+                    undone_line.clear_value(undone_i)
+                else:
+                    undone_line.set_value(undone_i, value)
+                undone_line.compute_score()
+        # Branches start from a fully propagated grid, so nothing was waiting to be solved
+        self.lines_to_solve.clear()
+        self.publish_changes()
+
+    def assign_cell(self, x, y, value):
+        line = self.vertical_lines[x]
+        self.set_cell(line, y, value)
+        line.compute_score()
+        self.add_line_to_solve(line)
+
+    def probe_cell(self, x, y, value):
+        # Return the cells deduced from setting the cell to value, or None on a contradiction
+        mark = len(self.trail)
+        try:
+            self.assign_cell(x, y, value)
+            self.propagate(self.line_solver)
+            deduced = {}
+            for line, i, _ in self.trail[mark:]:
+                cell_x, cell_y = line.get_cell(i)
+                deduced[cell_x, cell_y] = self.grid[cell_x][cell_y]
+        except (AssertionError, IndexError):
+            deduced = None
+        finally:
+            self.undo(mark)
+        return deduced
+
+    def probe(self):
+        outer_trail = self.trail
+        if self.trail is None:
+            self.trail = []
+        try:
+            # Cells close to the latest deductions are probed first
+            cells_to_probe = deque(
+                (x, y) for x in range(self.size_x) for y in range(self.size_y) if self.grid[x][y] == UNKNOWN
+            )
+            cells_to_probe_set = set(cells_to_probe)
+            while cells_to_probe:
+                x, y = cells_to_probe.popleft()
+                cells_to_probe_set.remove((x, y))
+                if self.grid[x][y] != UNKNOWN:
+                    continue
+
+                filled_deduced = self.probe_cell(x, y, FILLED)
+                empty_deduced = self.probe_cell(x, y, EMPTY)
+                if filled_deduced is None and empty_deduced is None:
+                    raise AssertionError
+                elif filled_deduced is None:
+                    deduced = {(x, y): EMPTY}
+                elif empty_deduced is None:
+                    deduced = {(x, y): FILLED}
+                else:
+                    deduced = {
+                        cell: value for cell, value in filled_deduced.items()
+                        if empty_deduced.get(cell) == value
+                    }
+                if not deduced:
+                    continue
+
+                mark = len(self.trail)
+                for (cell_x, cell_y), value in deduced.items():
+                    if self.grid[cell_x][cell_y] == UNKNOWN:
+                        self.assign_cell(cell_x, cell_y, value)
+                self.propagate(self.line_solver)
+
+                for line, i, _ in self.trail[mark:]:
+                    x, y = line.get_cell(i)
+                    for cell in itertools.chain(self.vertical_lines[x].coordinates, self.horizontal_lines[y].coordinates):
+                        if cell not in cells_to_probe_set and self.grid[cell[0]][cell[1]] == UNKNOWN:
+                            cells_to_probe.appendleft(cell)
+                            cells_to_probe_set.add(cell)
+        finally:
+            if outer_trail is None:
+                self.trail = None
+
+    def get_line_values(self, line):
+        if line.orientation == 'vertical':
+            return list(self.grid[line.index])
+        if self.compact:
+            return self.grid.get_row(line.index)
+        y = line.index
+        return [column[y] for column in self.grid]
+
+    def get_line_placements(self, line):
+        _clues, _values, (clues_start, clues_end), (values_start, values_end) = Nonogram.get_unsolved_part(
+            line.clues,
+            self.get_line_values(line)
+        )
+        return [
+            (*_values[:values_start], *placement, *_values[values_end:])
+            for placement in self.get_placements(
+                _clues[clues_start:clues_end],
+                _values[values_start:values_end],
+                self.check_budget if self.bounded else None,
+            )
+        ]
+
+    def get_most_constrained_line(self, lines):
+        # Counts are capped at the best count so far, an unsolved line has at least two placements
+        best_line, best_count = None, None
+        for line in lines:
+            count = self.count_placements(line.clues, self.get_line_values(line), cap=best_count)
+            if best_count is None or count < best_count:
+                best_line, best_count = line, count
+                if count <= 2:
+                    break
+        return best_line, best_count
+
+    def get_line_segments(self, line):
+        # Parts of the line with unknown cells, as (start, end, clues), split at the empty cells where only one split
+        # of the clues between both sides fits. Each part can then be solved without looking at the others.
+        clues = line.clues
+        values = self.get_line_values(line)
+        left, right, _ = self.get_line_reachability(clues, values)
+        segments = []
+        start = clues_start = 0
+        for i, value in enumerate(values):
+            if value != EMPTY:
+                continue
+            splits = [j for j in range(clues_start, len(clues) + 1) if left[j][i] and right[j][i + 1]]
+            if len(splits) == 1:
+                segments.append((start, i, clues[clues_start:splits[0]]))
+                start, clues_start = i + 1, splits[0]
+        segments.append((start, len(values), clues[clues_start:]))
+        return [(start, end, clues) for start, end, clues in segments if UNKNOWN in values[start:end]]
+
+    def get_independent_regions(self):
+        # Group the segments of the unsolved lines that share unknown cells, no line constrains two regions together
+        parent = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        segments = []
+        for line in itertools.chain(self.horizontal_lines, self.vertical_lines):
+            if not self.is_unsolved(line):
+                continue
+            values = self.get_line_values(line)
+            for start, end, clues in self.get_line_segments(line):
+                cells = [line.get_cell(i) for i in range(start, end) if values[i] == UNKNOWN]
+                for cell in cells:
+                    parent.setdefault(cell, cell)
+                root = find(cells[0])
+                for cell in cells[1:]:
+                    parent[find(cell)] = root
+                segments.append((line, start, end, clues, cells[0]))
+
+        regions = {}
+        for line, start, end, clues, cell in segments:
+            regions.setdefault(find(cell), []).append((line, start, end, clues))
+        return list(regions.values())
+
+    def search_region(self, segments, depth=0):
+        # Guess on the segment of the region with the fewest placements, only cells of the region change
+        best = None
+        for line, start, end, clues in segments:
+            values = self.get_line_values(line)[start:end]
+            if UNKNOWN not in values:
+                continue
+            count = self.count_placements(clues, values, cap=best[0] if best else None)
+            if best is None or count < best[0]:
+                best = count, line, start, end, clues, values
+        if best is None:
+            return True
+
+        if self.bounded:
+            self.check_budget()
+        _, line_to_solve, start, end, clues, values = best
+        line_values = self.get_line_values(line_to_solve)
+        for placement in self.get_placements(clues, values, self.check_budget if self.bounded else None):
+            mark = len(self.trail)
+            if self.stats:
+                self.stats.record_guess(line_to_solve, depth)
+            try:
+                self.update_grid_from_values(line_to_solve, (*line_values[:start], *placement, *line_values[end:]))
+                self.add_line_to_solve(line_to_solve)
+                self.propagate(self.line_solver)
+                if self.search_region(segments, depth + 1):
+                    return True
+            except (AssertionError, IndexError):
+                pass
+            if self.stats:
+                self.stats.record_backtrack(line_to_solve, depth)
+            self.undo(mark)
+        return False
+
+    def solve_regions(self, regions):
+        # Search the regions one after the other, a failed region does not undo the ones before it.
+        # Without a solution for one of them, the grid goes back to where the search started.
+        self.trail = []
+        try:
+            for segments in regions:
+                if not self.search_region(segments):
+                    self.undo(0)
+                    return False
+            return True
+        except SolveInterrupted:
+            self.undo(0)
+            raise
+        finally:
+            self.trail = None
+
+    def search_with_trail(self, depth=0, solutions=None, limit=1):
+        # Without solutions, stop at the first complete grid, else collect complete grids until there are limit of them
+        unsolved_lines = [line for line in itertools.chain(self.horizontal_lines, self.vertical_lines) if self.is_unsolved(line)]
+        if not unsolved_lines:
+            # A complete grid is only a solution when all of its lines match their clues
+            if not self.is_solution():
+                return False
+            if solutions is None:
+                return True
+            solutions.append(self.get_rows())
+            return len(solutions) >= limit
+
+        self.node_count += 1
+        if self.node_budget is not None and self.node_count > self.node_budget:
+            raise SearchSplit([self.get_snapshot()])
+        if self.bounded:
+            self.check_budget()
+        if self.checkpoint is not None and solutions is None and time.perf_counter() >= self.next_checkpoint:
+            self.save_checkpoint(self.get_search_path())
+
+        with self.measure('branching'):
+            line_to_solve, branches = self.branching.get_branches(self, unsolved_lines)
+        start = self.resume_path.popleft() if self.resume_path else 0
+        for k in range(start, len(branches)):
+            new_values = branches[k]
+            mark = len(self.trail)
+            if self.stats:
+                self.stats.record_guess(line_to_solve, depth)
+            self.search_path.append(k)
+            try:
+                self.update_grid_from_values(line_to_solve, new_values)
+                # A guess that is not a whole placement has to be checked against the clues of its own line too
+                self.add_line_to_solve(line_to_solve)
+                self.propagate(self.line_solver)
+                if self.search_with_trail(depth + 1, solutions, limit):
+                    return True
+            except (AssertionError, IndexError):
+                pass
+            except SearchSplit as split:
+                self.undo(mark)
+                split.snapshots.extend(self.get_branch_snapshots(line_to_solve, branches[k + 1:], propagate=False))
+                raise
+            except (SolveInterrupted, KeyboardInterrupt):
+                # The deepest frame records the path, the branch taken here was not fully searched
+                if self.interrupted_path is None:
+                    self.interrupted_path = self.get_search_path()
+                raise
+            finally:
+                self.search_path.pop()
+            if self.stats:
+                self.stats.record_backtrack(line_to_solve, depth)
+            self.undo(mark)
+        return False
+
+    def encode_grid(self):
+        return array('b', itertools.chain.from_iterable(self.grid)).tobytes()
+
+    def decode_grid(self, data):
+        cells = array('b')
+        cells.frombytes(data)
+        return [cells[x * self.size_y:(x + 1) * self.size_y] for x in range(self.size_x)]
+
+    def get_checkpoint_clues(self):
+        return [list(clues) for clues in self.vertical_clues], [list(clues) for clues in self.horizontal_clues]
+
+    def get_search_path(self):
+        # While resuming, the branches not gone back down to yet are still part of the path
+        return [*self.search_path, *(self.resume_path or ())]
+
+    def clear_search_path(self):
+        self.search_root = None
+        self.search_path = []
+        self.resume_path = None
+        self.interrupted_path = None
+
+    def save_checkpoint(self, path):
+        # Replaces the checkpoint file at once, a crash while writing leaves the previous one
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'clues': self.get_checkpoint_clues(),
+            'options': self.options,
+            'root': self.search_root,
+            'path': path,
+            'node_count': self.node_count,
+        }
+        temporary_path = f'{self.checkpoint}.tmp'
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, self.checkpoint)
+        self.next_checkpoint = time.perf_counter() + self.checkpoint_interval
+
+    @staticmethod
+    def read_checkpoint(path):
+        with open(path, 'rb') as file:
+            state = pickle.load(file)
+        if not isinstance(state, dict) or state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"'{path}' is not a version {CHECKPOINT_VERSION} checkpoint")
+        return state
+
+    @classmethod
+    def from_checkpoint(cls, path, **options):
+        # A solver of the puzzle of the checkpoint, with its options unless overridden, that resumes from it
+        state = cls.read_checkpoint(path)
+        return cls(clues=state['clues'], **{**state['options'], **options, 'checkpoint': path})
+
+    def load_checkpoint(self):
+        state = self.read_checkpoint(self.checkpoint)
+        if state['clues'] != self.get_checkpoint_clues():
+            raise ValueError(f"The checkpoint '{self.checkpoint}' is for another puzzle")
+        self.search_root = state['root']
+        self.load_grid(self.decode_grid(self.search_root))
+        self.resume_path = deque(state['path'])
+        self.node_count = state['node_count']
+
+    def is_solution(self):
+        # Whether every cell is known and every line matches its clues
+        return all(
+            self.get_clues_from_values(self.get_line_values(line)) == list(line.clues) and not self.is_unsolved(line)
+            for line in itertools.chain(self.horizontal_lines, self.vertical_lines)
+        )
+
+    def get_rows(self):
+        return tuple(tuple(self.grid[x][y] for x in range(self.size_x)) for y in range(self.size_y))
+
+    def get_snapshot(self):
+        return tuple(map(tuple, self.grid))
+
+    def load_grid(self, snapshot):
+        # Start from a snapshot of the grid of another solver of the same puzzle
+        for x, values in enumerate(snapshot):
+            line = self.vertical_lines[x]
+            self.update_grid_from_values(line, values)
+            self.add_line_to_solve(line)
+
+    def get_branch_snapshots(self, line, branches, propagate=True):
+        # Grids of the given branches, propagated or not, the ones that are contradictions left out
+        outer_trail = self.trail
+        if self.trail is None:
+            self.trail = []
+        snapshots = []
+        try:
+            for new_values in branches:
+                mark = len(self.trail)
+                try:
                     self.update_grid_from_values(line, new_values)
+                    self.add_line_to_solve(line)
+                    if propagate:
+                        self.propagate(self.line_solver)
+                    snapshots.append(self.get_snapshot())
+                except (AssertionError, IndexError):
+                    pass
+                finally:
+                    self.undo(mark)
+        finally:
+            self.trail = outer_trail
+        return snapshots
+
+    def split(self):
+        # Propagated grids of every branch of the next guess
+        unsolved_lines = [line for line in itertools.chain(self.horizontal_lines, self.vertical_lines) if self.is_unsolved(line)]
+        line_to_solve, branches = self.branching.get_branches(self, unsolved_lines)
+        return self.get_branch_snapshots(line_to_solve, branches)
 
+    def deduce(self):
+        # Line solving, then probing when enabled, leaves the unsolved lines queued for the search.
+        # On large boards the quick pass re-solves long lines many times over, the complete solver alone is faster.
+        # It is also skipped after a change of clues, the line cache of the previous solves serves the complete solver.
+        if self.compact or self.edited:
+            solve_functions = (self.line_solver,)
+        else:
+            solve_functions = (self.optimized_solve_for_values, self.line_solver)
+        self.tracking = self.dependencies is not None and self.search_depth == 0 and self.trail is None
+        try:
+            if self.vectorized:
+                from sweeps import sweep
+                with self.measure('sweeps'):
+                    unknown_count = sum(line.unknown_count for line in self.vertical_lines)
+                    while self.lines_to_solve and sweep(self, list(self.lines_to_solve)):
+                        pass
+                    if self.stats:
+                        self.stats.add_deduced_cells('sweeps', unknown_count - sum(line.unknown_count for line in self.vertical_lines))
+            for solve_function in solve_functions:
+                with self.measure(solve_function.__name__):
+                    self.propagate(solve_function)
+
+                for line in itertools.chain(self.horizontal_lines, self.vertical_lines):
+                    if self.is_unsolved(line):
+                        self.add_line_to_solve(line)
+        finally:
+            self.tracking = False
+
+        if self.lines_to_solve and self.probing:
+            self.lines_to_solve.clear()
+            with self.measure('probing'):
+                unknown_count = sum(line.unknown_count for line in self.vertical_lines)
+                self.probe()
+                if self.stats:
+                    self.stats.add_deduced_cells('probing', unknown_count - sum(line.unknown_count for line in self.vertical_lines))
             for line in itertools.chain(self.horizontal_lines, self.vertical_lines):
                 if self.is_unsolved(line):
                     self.add_line_to_solve(line)
 
-        if self.lines_to_solve:
-            line_to_solve_sorted_by_number_of_placements = sorted(
-                self.lines_to_solve,
-                key=lambda l: len(self.get_placements(l.clues, [self.grid[x][y] for x, y in l.coordinates]))
-            )
+    def set_clues(self, orientation, index, clues):
+        # Change the clues of one line, the next solve() starts from the cells deduced without them.
+        # Without incremental, no dependency is known and the whole grid is cleared.
+        if orientation not in ORIENTATIONS:
+            raise ValueError(f"Unknown orientation '{orientation}', expected one of {ORIENTATIONS}")
+        clues = list(clues)
+        edited_line = (self.vertical_lines if orientation == 'vertical' else self.horizontal_lines)[index]
+        if tuple(clues) == edited_line.clues_key:
+            return
+        if orientation == 'vertical':
+            self.vertical_clues = [*self.vertical_clues[:index], clues, *self.vertical_clues[index + 1:]]
+        else:
+            self.horizontal_clues = [*self.horizontal_clues[:index], clues, *self.horizontal_clues[index + 1:]]
+        edited_line.set_clues(clues)
+        self.edited = True
+        self.clear_search_path()
 
-            # Take a guess on the line that have the fewest number of placements possible
-            line_to_solve = line_to_solve_sorted_by_number_of_placements[0]
-            self.lines_to_solve.remove(line_to_solve)
-            self.lines_to_solve_set.remove(line_to_solve)
+        # Lines queued by an earlier change stay queued, the others are queued in grid order
+        lines_to_solve = {edited_line: None}
+        for x, line in enumerate(self.vertical_lines):
+            for y in range(self.size_y):
+                if self.grid[x][y] == UNKNOWN:
+                    continue
+                dependencies = self.dependencies[x][y] if self.dependencies is not None else 0
+                if dependencies == 0 or dependencies & edited_line.bit:
+                    crossing_line = self.horizontal_lines[y]
+                    self.grid[x][y] = UNKNOWN
+                    line.clear_value(y)
+                    crossing_line.clear_value(x)
+                    line.unknown_count += 1
+                    crossing_line.unknown_count += 1
+                    lines_to_solve.update(dict.fromkeys((line, crossing_line)))
+                    if self.dependencies is not None:
+                        self.dependencies[x][y] = 0
+                    if self.observed:
+                        self.changed_cells.append((x, y))
 
-            _clues, _values, (clues_start, clues_end), (values_start, values_end) = Nonogram.get_unsolved_part(
-                line_to_solve.clues,
-                [self.grid[x][y] for x, y in line_to_solve.coordinates]
-            )
-            for placement in self.get_placements(_clues[clues_start:clues_end], _values[values_start:values_end]):
-                grid_copy = [row[:] for row in self.grid]
-                new_values = (
-                    *_values[:values_start],
-                    *placement,
-                    *_values[values_end:],
-                )
+        if self.dependencies is not None:
+            for x, line in enumerate(self.vertical_lines):
+                line.dependencies = functools.reduce(operator.or_, self.dependencies[x], 0)
+            for y, line in enumerate(self.horizontal_lines):
+                line.dependencies = functools.reduce(operator.or_, (column[y] for column in self.dependencies), 0)
+        for line in lines_to_solve:
+            line.compute_score()
+            self.add_line_to_solve(line)
+        self.publish_changes()
+
+    def count_solutions(self, limit=2):
+        # Keep searching after the first solution, returns the number of solutions up to limit and the ones found
+        self.start_budget()
+        try:
+            self.deduce()
+        except (AssertionError, IndexError):
+            return 0, []
+        return self.search_solutions(limit)
+
+    def search_solutions(self, limit):
+        solutions = []
+        self.lines_to_solve.clear()
+        self.trail = []
+        try:
+            with self.measure('search'):
+                self.search_with_trail(solutions=solutions, limit=limit)
+        finally:
+            # The solutions are kept as rows, the grid goes back to the deductions
+            self.undo(0)
+            self.trail = None
+        return len(solutions), solutions
+
+    def is_unique(self):
+        return self.count_solutions(2)[0] == 1
+
+    def solve(self):
+        if self.search_depth == 0:
+            self.start_budget()
+        if self.checkpoint is not None and self.search_depth == 0 and os.path.exists(self.checkpoint):
+            # The grid of the checkpoint is the one the search started from, already deduced
+            self.load_checkpoint()
+        else:
+            self.deduce()
+
+        regions = None
+        if self.lines_to_solve and self.decompose:
+            with self.measure('decomposition'):
+                regions = self.get_independent_regions()
+
+        if regions is not None and (len(regions) > 1 or self.search_mode != 'parallel'):
+            self.lines_to_solve.clear()
+            with self.measure('search'):
+                if self.search_mode == 'parallel':
+                    # Imported here, the workers import this module
+                    from parallel import solve_regions_in_parallel
+                    solution = solve_regions_in_parallel(self, len(regions), self.processes)
+                    if solution is not None:
+                        self.load_grid(solution)
+                        self.propagate(self.line_solver)
+                else:
+                    self.solve_regions(regions)
+        elif self.lines_to_solve and self.search_mode == 'parallel':
+            from parallel import solve_in_parallel
+            self.lines_to_solve.clear()
+            with self.measure('search'):
+                solution = solve_in_parallel(self, self.processes)
+            if solution is not None:
+                self.load_grid(solution)
+                self.propagate(self.line_solver)
+        elif self.lines_to_solve and self.search_mode == 'trail':
+            self.lines_to_solve.clear()
+            self.trail = []
+            if self.checkpoint is not None:
+                if self.search_root is None:
+                    self.search_root = self.encode_grid()
+                self.next_checkpoint = time.perf_counter() + self.checkpoint_interval
+            try:
+                with self.measure('search'):
+                    self.search_with_trail()
+            except (SolveInterrupted, KeyboardInterrupt):
+                # An interrupted search can be resumed from where it stopped
+                if self.checkpoint is not None:
+                    self.save_checkpoint(self.interrupted_path if self.interrupted_path is not None else self.get_search_path())
+                # Back to the grid of the deductions made before the first guess
+                self.undo(0)
+                raise
+            else:
+                if self.checkpoint is not None:
+                    with suppress(FileNotFoundError):
+                        os.remove(self.checkpoint)
+            finally:
+                self.trail = None
+                # The next search starts from its own grid, or from the checkpoint file
+                self.clear_search_path()
+        elif self.lines_to_solve:
+            with self.measure('branching'):
+                line_to_solve, branches = self.branching.get_branches(self, list(self.lines_to_solve))
+            self.lines_to_solve.discard(line_to_solve)
+
+            for new_values in branches:
+                if self.bounded:
+                    self.check_budget()
+                grid_copy = self.grid.copy() if self.compact else [row[:] for row in self.grid]
+                if self.stats:
+                    self.stats.record_guess(line_to_solve, self.search_depth)
                 self.update_grid_from_values(line_to_solve, new_values)
+                self.add_line_to_solve(line_to_solve)
+                self.search_depth += 1
                 try:
                     self.solve()
-                    if any(self.is_unsolved(line) for line in itertools.chain(self.horizontal_lines, self.vertical_lines)):
+                    if not self.is_solution():
                         raise AssertionError
                     else:
                         break
                 except (AssertionError, IndexError):
-                    self.grid = grid_copy
-                    for line in itertools.chain(self.horizontal_lines, self.vertical_lines):
-                        line.unknown_count = [self.grid[x][y] for x, y in line.coordinates].count(UNKNOWN)
-                        line.compute_score()
+                    if self.stats:
+                        self.stats.record_backtrack(line_to_solve, self.search_depth - 1)
+                    self.restore_grid(grid_copy)
+                except SolveInterrupted:
+                    self.restore_grid(grid_copy)
+                    raise
+                finally:
+                    self.search_depth -= 1
 
-        return tuple(tuple(self.grid[x][y] for x in range(self.size_x)) for y in range(self.size_y))
+        return self.get_rows()
+
+    def restore_grid(self, grid):
+        self.grid = grid
+        for line in itertools.chain(self.horizontal_lines, self.vertical_lines):
+            values = self.get_line_values(line)
+            line.unknown_count = values.count(UNKNOWN)
+            line.filled, line.empty = self.values_to_masks(values)
+            line.compute_score()
+        if self.observed:
+            self.publish_grid()
+
+    def solve_with_status(self):
+        # Anytime solve: on a contradiction or once the budget runs out, the grid of the sound deductions so far
+        try:
+            grid = self.solve()
+        except (AssertionError, IndexError):
+            return SolveResult('contradiction', self.get_rows())
+        except SolveInterrupted as interruption:
+            return SolveResult(interruption.status, self.get_rows())
+        return SolveResult('solved' if self.is_solution() else 'contradiction', grid)
 
     def __str__(self):
         s = ""
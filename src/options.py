@@ -0,0 +1,38 @@
+from nonogram import BRANCHING_STRATEGIES, LINE_SOLVERS, SEARCH_MODES
+
+# Solver options of main.py, batch.py and server.py, declared once so that the three of them stay the same
+
+
+def add_solver_arguments(parser, budget=False):
+    parser.add_argument('-s', '--line-solver', default='bitset', choices=LINE_SOLVERS)
+    parser.add_argument('--search', default='trail', choices=SEARCH_MODES)
+    parser.add_argument('-p', '--probing', action='store_true')
+    parser.add_argument('--decompose', action='store_true',
+                        help="search the independent regions left after line solving one at a time")
+    parser.add_argument('-b', '--branching', default='fewest_placements', choices=BRANCHING_STRATEGIES)
+    parser.add_argument('--compact', action='store_true',
+                        help="keep the grid in a single array, for very large boards")
+    parser.add_argument('--vectorized', action='store_true',
+                        help="start with sweeps over all the lines at once, needs NumPy")
+    if budget:
+        parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                            help="stop a puzzle after that long and keep the cells deduced so far")
+        parser.add_argument('--max-steps', type=int, help="stop a puzzle after that many line solves and guesses")
+
+
+def get_solver_options(args, budget=False):
+    options = {
+        'line_solver': args.line_solver,
+        'search': args.search,
+        'probing': args.probing,
+        'decompose': args.decompose,
+        'branching': args.branching,
+        'compact': args.compact,
+        'vectorized': args.vectorized,
+    }
+    if budget:
+        assert args.timeout is None or 0 < args.timeout, "The timeout should be strictly positive."
+        assert args.max_steps is None or 1 <= args.max_steps, "The number of steps should be strictly positive."
+        options['timeout'] = args.timeout
+        options['max_steps'] = args.max_steps
+    return options
@@ -0,0 +1,140 @@
+import os
+import queue
+import threading
+from collections import deque
+from multiprocessing import TimeoutError, get_context
+
+from constants import *
+from nonogram import LineCache, Nonogram, SearchSplit
+
+# Nodes a worker searches before it gives the unexplored part of its subtree back to be shared out again
+NODE_BUDGET = 1000
+# Subproblems per process made before starting the workers
+SUBPROBLEMS_PER_PROCESS = 4
+# Seconds between two checks of the deadline and the cancellation token of the solve while waiting for the workers
+POLL_INTERVAL = 0.05
+
+worker_clues = None
+worker_options = {}
+worker_cache = None
+
+
+def init_worker(clues, options, cache_size):
+    global worker_clues, worker_options, worker_cache
+    worker_clues = clues
+    worker_options = options
+    worker_cache = LineCache(cache_size)
+
+
+def is_complete(snapshot):
+    return all(UNKNOWN not in values for values in snapshot)
+
+
+def solve_subproblem(snapshot, node_budget=NODE_BUDGET):
+    # Return ('solved', snapshot), ('failed', None) when the subproblem has no solution,
+    # or ('split', snapshots) when the budget ran out before the whole subtree was searched
+    nonogram = Nonogram(clues=worker_clues, cache=worker_cache, search='trail', **worker_options)
+    nonogram.node_budget = node_budget
+    try:
+        nonogram.load_grid(snapshot)
+        nonogram.solve()
+    except (AssertionError, IndexError):
+        return 'failed', None
+    except SearchSplit as split:
+        return 'split', split.snapshots
+    snapshot = nonogram.get_snapshot()
+    return ('solved', snapshot) if is_complete(snapshot) else ('failed', None)
+
+
+def solve_region(task):
+    # Rebuild the regions of the snapshot, they come in the same order as in the master, and solve one of them
+    snapshot, region_index = task
+    nonogram = Nonogram(clues=worker_clues, cache=worker_cache, **worker_options)
+    nonogram.load_grid(snapshot)
+    nonogram.lines_to_solve.clear()
+    regions = nonogram.get_independent_regions()
+    return nonogram.get_snapshot() if nonogram.solve_regions([regions[region_index]]) else None
+
+
+def split_frontier(nonogram, count):
+    # Breadth first expansion of the top of the guess tree, stops early on a solution
+    frontier = deque(nonogram.split())
+    while frontier and len(frontier) < count:
+        snapshot = frontier.popleft()
+        if is_complete(snapshot):
+            return [snapshot]
+        subproblem = Nonogram(clues=(nonogram.vertical_clues, nonogram.horizontal_clues), cache=nonogram.cache, **nonogram.options)
+        try:
+            subproblem.load_grid(snapshot)
+            subproblem.deduce()
+        except (AssertionError, IndexError):
+            continue
+        if any(subproblem.is_unsolved(line) for line in subproblem.vertical_lines):
+            frontier.extend(subproblem.split())
+        else:
+            return [subproblem.get_snapshot()]
+    return list(frontier)
+
+
+def wait_for(nonogram, get):
+    # Terminating the pool on the way out of its block stops the workers of an interrupted solve
+    while True:
+        try:
+            return get(POLL_INTERVAL)
+        except (queue.Empty, TimeoutError):
+            if nonogram.bounded:
+                nonogram.check_interruption()
+
+
+def get_pool(nonogram, processes, cache_size):
+    # A solve running on a thread next to the GUI spawns its workers, a fork would copy the state of the other threads.
+    # Leaving the block of the pool terminates them, which cancels the tasks still running or waiting.
+    context = get_context() if threading.current_thread() is threading.main_thread() else get_context('spawn')
+    clues = (nonogram.vertical_clues, nonogram.horizontal_clues)
+    return context.Pool(processes, initializer=init_worker, initargs=(clues, nonogram.options, cache_size))
+
+
+def solve_regions_in_parallel(nonogram, region_count, processes=None, cache_size=200000):
+    # Solve each independent region of the grid in its own task, return the merged solution snapshot or None
+    snapshot = nonogram.get_snapshot()
+    merged = [list(values) for values in snapshot]
+    with get_pool(nonogram, processes or os.cpu_count(), cache_size) as pool:
+        solutions = pool.imap_unordered(solve_region, ((snapshot, i) for i in range(region_count)))
+        for _ in range(region_count):
+            solution = wait_for(nonogram, solutions.next)
+            if solution is None:
+                return None
+            for x, values in enumerate(solution):
+                for y, value in enumerate(values):
+                    if value != UNKNOWN:
+                        merged[x][y] = value
+    return merged
+
+
+def solve_in_parallel(nonogram, processes=None, node_budget=NODE_BUDGET, cache_size=200000):
+    # Search the propagated grid of the nonogram on a pool of processes, return a solution snapshot or None
+    processes = processes or os.cpu_count()
+    frontier = split_frontier(nonogram, SUBPROBLEMS_PER_PROCESS * processes)
+    if len(frontier) == 1 and is_complete(frontier[0]):
+        return frontier[0]
+
+    results = queue.SimpleQueue()
+    with get_pool(nonogram, processes, cache_size) as pool:
+        pending = 0
+        for snapshot in frontier:
+            pool.apply_async(solve_subproblem, (snapshot, node_budget), callback=results.put, error_callback=results.put)
+            pending += 1
+        while pending:
+            result = wait_for(nonogram, lambda timeout: results.get(timeout=timeout))
+            pending -= 1
+            if isinstance(result, BaseException):
+                raise result
+            status, value = result
+            if status == 'solved':
+                return value
+            if status == 'split':
+                # The idle workers pick up the pieces of the subtree that was too big
+                for snapshot in value:
+                    pool.apply_async(solve_subproblem, (snapshot, node_budget), callback=results.put, error_callback=results.put)
+                    pending += 1
+    return None
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import functools
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import init_worker, solve_puzzle
+from formats import make_puzzle
+from options import add_solver_arguments, get_solver_options
+
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+MAX_BODY_SIZE = 1 << 20
+# Results that are the same for every later solve of the puzzle, the others are not remembered
+FINAL_STATUSES = ('solved', 'contradiction')
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def get_clues_key(puzzle):
+    data = json.dumps([puzzle['vertical'], puzzle['horizontal']], separators=(',', ':'))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def parse_puzzle(data):
+    # Check the clues of a request, make_puzzle drops the zero clues like for the puzzle files
+    if not isinstance(data, dict) or 'vertical' not in data or 'horizontal' not in data:
+        raise ValueError("The request should be a JSON object with the 'vertical' and 'horizontal' clues")
+    clues = []
+    for name in ('vertical', 'horizontal'):
+        lines = data[name]
+        if (
+            not isinstance(lines, list)
+            or not lines
+            or not all(isinstance(line, list) and all(type(clue) is int and clue >= 0 for clue in line) for line in lines)
+        ):
+            raise ValueError(f"The '{name}' clues should be a non empty list of lists of positive integers")
+        clues.append(lines)
+    return make_puzzle(*clues, data.get('id'))
+
+
+class ResultCache:
+    # The most recently asked for results, by the key of their puzzle
+    def __init__(self, max_results):
+        self.max_results = max_results
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.results.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.results[key] = result
+        self.results.move_to_end(key)
+        if len(self.results) > self.max_results:
+            self.results.popitem(last=False)
+
+    def get_stats(self):
+        return {
+            'remembered': len(self.results),
+            'max_results': self.max_results,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class SolveService:
+    # Solves puzzles on worker processes that stay up between requests, with their line caches. The final results
+    # are remembered by the hash of their clues, and a puzzle asked for again while it is solved waits for that solve.
+    def __init__(self, processes=None, options=None, cache_size=200000, max_results=1024):
+        self.processes = processes or os.cpu_count()
+        self.executor = ProcessPoolExecutor(self.processes, initializer=init_worker, initargs=(options or {}, cache_size))
+        self.results = ResultCache(max_results)
+        self.pending = {}
+        self.solve_count = 0
+        self.coalesced_count = 0
+
+    async def start(self):
+        # One task per worker starts all of them, so the first requests do not wait for the processes
+        loop = asyncio.get_running_loop()
+        puzzle = make_puzzle([[1]], [[1]])
+        await asyncio.gather(*(loop.run_in_executor(self.executor, solve_puzzle, (0, puzzle)) for _ in range(self.processes)))
+
+    async def solve(self, puzzle):
+        key = get_clues_key(puzzle)
+        result = self.results.get(key)
+        cached = result is not None
+        if not cached:
+            future = self.pending.get(key)
+            if future is None:
+                future = asyncio.ensure_future(self.run(key, puzzle))
+                self.pending[key] = future
+                future.add_done_callback(lambda _: self.pending.pop(key, None))
+            else:
+                self.coalesced_count += 1
+            # A client that goes away does not cancel the solve the others wait for
+            result = await asyncio.shield(future)
+        return {**result, 'id': puzzle.get('id'), 'key': key, 'cached': cached}
+
+    async def run(self, key, puzzle):
+        self.solve_count += 1
+        result = await asyncio.get_running_loop().run_in_executor(self.executor, solve_puzzle, (0, puzzle))
+        del result['index'], result['id']
+        if result['status'] in FINAL_STATUSES:
+            self.results.put(key, result)
+        return result
+
+    def get_stats(self):
+        return {
+            'processes': self.processes,
+            'solves': self.solve_count,
+            'coalesced': self.coalesced_count,
+            'pending': len(self.pending),
+            'results': self.results.get_stats(),
+        }
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def handle(service, method, path, body):
+    # Return the HTTP status and the JSON payload of a request, without any network involved
+    if path == '/solve':
+        if method != 'POST':
+            return 405, {'error': "Use POST to solve a puzzle"}
+        try:
+            puzzle = parse_puzzle(json.loads(body))
+        except ValueError as error:
+            return 400, {'error': str(error)}
+        return 200, await service.solve(puzzle)
+    if path == '/stats':
+        if method != 'GET':
+            return 405, {'error': "Use GET to read the statistics"}
+        return 200, service.get_stats()
+    return 404, {'error': f"Unknown path '{path}'"}
+
+
+async def read_request(reader):
+    try:
+        method, path, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise RequestError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise RequestError(400, "Malformed Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise RequestError(413, f"The body should be at most {MAX_BODY_SIZE} bytes")
+    body = await reader.readexactly(length) if length > 0 else b''
+    return method, path, body
+
+
+def format_response(status, payload):
+    body = json.dumps(payload).encode()
+    head = (
+        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n"
+    )
+    return head.encode('latin-1') + body
+
+
+async def handle_connection(service, reader, writer):
+    # One request per connection
+    try:
+        try:
+            status, payload = await handle(service, *await read_request(reader))
+        except RequestError as error:
+            status, payload = error.status, {'error': str(error)}
+        except asyncio.IncompleteReadError:
+            return
+        except Exception as error:
+            status, payload = 500, {'error': repr(error)}
+        writer.write(format_response(status, payload))
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host, port, unix_path=None):
+    await service.start()
+    handler = functools.partial(handle_connection, service)
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    print(f"Serving on {unix_path or f'{host}:{port}'}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve solve requests on localhost, as JSON over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', choices=LOCAL_HOSTS)
+    parser.add_argument('--port', default=8765, type=int)
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of a TCP port")
+    parser.add_argument('-j', '--processes', default=os.cpu_count(), type=int)
+    parser.add_argument('--cache-size', default=200000, type=int)
+    parser.add_argument('--max-results', default=1024, type=int, help="number of results remembered")
+    add_solver_arguments(parser, budget=True)
+    args = parser.parse_args()
+
+    assert 1 <= args.processes, "The number of processes should be strictly positive."
+    assert 1 <= args.max_results, "The number of results remembered should be strictly positive."
+    assert args.search != 'parallel', "The workers of the service cannot start processes of their own."
+
+    options = get_solver_options(args, budget=True)
+    service = SolveService(args.processes, options, args.cache_size, args.max_results)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Vectorized sweeps over many lines at once, for the first passes of large boards where most cells get decided.
+# The lines of the same length are stacked in boolean matrices of their filled and empty cells, with their clues
+# padded into a matrix, and each clue gets its leftmost and rightmost start. The cells every placement between the
+# two covers are filled, the ones no placement can reach are empty.
+
+
+def get_masks_matrix(masks, length):
+    size = (length + 7) // 8
+    data = np.frombuffer(b''.join(mask.to_bytes(size, 'little') for mask in masks), np.uint8).reshape(len(masks), size)
+    return np.unpackbits(data, axis=1, count=length, bitorder='little').astype(bool)
+
+
+def get_matrix_masks(matrix):
+    return [int.from_bytes(row.tobytes(), 'little') for row in np.packbits(matrix, axis=1, bitorder='little')]
+
+
+def get_clues_matrix(lines):
+    counts = np.array([line.clues_length for line in lines])
+    clues = np.zeros((len(lines), max(counts.max(), 1)), np.int64)
+    for i, line in enumerate(lines):
+        clues[i, :line.clues_length] = line.clues
+    return clues, counts
+
+
+def get_covered_cells(starts, ends, selected, length):
+    # Cells inside at least one of the selected [start, end) spans of each line
+    rows = np.broadcast_to(np.arange(len(starts))[:, None], starts.shape)[selected]
+    delta = np.zeros((len(starts), length + 1), np.int64)
+    np.add.at(delta, (rows, starts[selected]), 1)
+    np.add.at(delta, (rows, ends[selected]), -1)
+    return np.cumsum(delta, axis=1)[:, :length] > 0
+
+
+def get_leading_count(cells, length):
+    return np.where(cells.all(axis=1), length, np.argmin(cells, axis=1))
+
+
+def deduce_lines(lines, length):
+    # Return the filled and empty masks of the lines after the overlap and edge deductions
+    filled = get_masks_matrix([line.filled for line in lines], length)
+    empty = get_masks_matrix([line.empty for line in lines], length)
+    clues, counts = get_clues_matrix(lines)
+    rows = np.arange(len(lines))
+    valid = np.arange(clues.shape[1]) < counts[:, None]
+
+    # Cells taken by the clues before each one, and from each one to the end, separators included
+    before = np.cumsum(clues, axis=1) - clues + np.arange(clues.shape[1])
+    after = (clues.sum(axis=1) + counts - 1)[:, None] - before
+    # The empty cells on the edges push every clue away from them
+    leftmost = before + get_leading_count(empty, length)[:, None]
+    rightmost = length - after - get_leading_count(empty[:, ::-1], length)[:, None]
+
+    # The first filled cell belongs to the first clue and the last one to the last clue
+    edged = filled.any(axis=1) & (counts > 0)
+    first = np.argmax(filled, axis=1)
+    rightmost[:, 0] = np.where(edged, np.minimum(rightmost[:, 0], first), rightmost[:, 0])
+    last_clues = np.maximum(counts - 1, 0)
+    last = length - np.argmax(filled[:, ::-1], axis=1) - clues[rows, last_clues]
+    leftmost[rows, last_clues] = np.where(edged, np.maximum(leftmost[rows, last_clues], last), leftmost[rows, last_clues])
+
+    if (valid & (leftmost > rightmost)).any():
+        raise AssertionError
+
+    new_filled = get_covered_cells(rightmost, leftmost + clues, valid & (rightmost < leftmost + clues), length)
+    new_empty = ~get_covered_cells(leftmost, rightmost + clues, valid, length)
+    if (new_filled & empty).any() or (new_empty & filled).any():
+        raise AssertionError
+    return get_matrix_masks(filled | new_filled), get_matrix_masks(empty | new_empty)
+
+
+def sweep(nonogram, lines):
+    # Deduce the cells of all the lines from the same grid, then write them through the normal line updates.
+    # Return whether a cell changed.
+    groups = {}
+    for line in lines:
+        groups.setdefault(line.length, []).append(line)
+    updates = []
+    for length, group in groups.items():
+        updates.extend(zip(group, *deduce_lines(group, length)))
+
+    changed = False
+    for line, filled, empty in updates:
+        # The crossing lines updated before may have set cells of this line since
+        if filled & line.empty or empty & line.filled:
+            raise AssertionError
+        if filled & ~line.filled or empty & ~line.empty:
+            nonogram.update_grid_from_masks(line, filled | line.filled, empty | line.empty)
+            changed = True
+    return changed